@@ -0,0 +1,110 @@
+"""
+Benchmark of copying synthetic trees of the test app's models with each engine.
+
+Reports the throughput (rows copied per second), the peak memory allocated by the
+copy (measured with `tracemalloc` in a separate run), and the wall time and the
+number of queries per phase (see `CopyReport`).
+
+    python -m benchmarks.bench_deepcopy wide [--posts N] [--comments N] [--reactions N]
+    python -m benchmarks.bench_deepcopy deep [--depth N] [--threads N]
+
+The trees are created in a fresh in-memory test database.
+"""
+import argparse
+import os
+import time
+import tracemalloc
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tests.settings')
+django.setup()
+
+from django.db import connection  # noqa: E402
+
+from django_deepcopy import (  # noqa: E402
+    ENGINE_NATIVE,
+    ENGINE_SQL,
+    CopyReport,
+    django_deepcopy,
+)
+from tests.shapes import count_rows, create_deep_forum, create_wide_forum  # noqa: E402
+
+
+def run(forum, engine, chunk_size=None):
+    report = CopyReport()
+    start = time.perf_counter()
+    new_forum = django_deepcopy(
+        forum, engine=engine, chunk_size=chunk_size, report=report
+    )
+    return new_forum, time.perf_counter() - start, report
+
+
+def measure_peak_memory(forum, engine, chunk_size=None):
+    tracemalloc.start()
+    try:
+        django_deepcopy(forum, engine=engine, chunk_size=chunk_size)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='shape', required=True)
+    wide = subparsers.add_parser('wide', help='1 forum x posts x comments')
+    wide.add_argument('--posts', type=int, default=1000)
+    wide.add_argument('--comments', type=int, default=50)
+    wide.add_argument('--reactions', type=int, default=0)
+    deep = subparsers.add_parser('deep', help='a chain of nested categories')
+    deep.add_argument('--depth', type=int, default=20)
+    deep.add_argument('--threads', type=int, default=10)
+    for subparser in (wide, deep):
+        subparser.add_argument(
+            '--engine',
+            action='append',
+            choices=[ENGINE_NATIVE, ENGINE_SQL],
+            help='may be given several times, defaults to all engines',
+        )
+        subparser.add_argument('--chunk-size', type=int)
+        subparser.add_argument('--no-memory', action='store_true')
+    args = parser.parse_args()
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        if args.shape == 'wide':
+            forum = create_wide_forum(
+                posts=args.posts,
+                comments_per_post=args.comments,
+                reactions_per_comment=args.reactions,
+            )
+        else:
+            forum = create_deep_forum(
+                depth=args.depth, threads_per_category=args.threads
+            )
+        rows = count_rows(forum)
+        print(f'{args.shape}: {rows} rows')
+
+        for engine in args.engine or [ENGINE_NATIVE, ENGINE_SQL]:
+            if engine != ENGINE_NATIVE and args.chunk_size:
+                continue
+            new_forum, elapsed, report = run(forum, engine, args.chunk_size)
+            assert count_rows(new_forum) == rows
+            print(
+                f'  {engine}: {elapsed * 1000:8.1f} ms, {rows / elapsed:10.0f} rows/s'
+            )
+            for phase in report.phases.values():
+                print(
+                    f'    {phase.name:<10} {phase.wall_time * 1000:8.1f} ms, '
+                    f'{phase.query_count:5} queries ({phase.query_time * 1000:.1f} ms)'
+                )
+            if not args.no_memory:
+                peak = measure_peak_memory(forum, engine, args.chunk_size)
+                print(f'    peak memory {peak / 2**20:.1f} MiB')
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Micro-benchmark of the primary/foreign key remapping of serialized objects.
+
+Compares the plan-based `create_new_pks_for_objects` against the previous
+implementation, which ran a UUID regex over every string value of every field.
+
+    python -m benchmarks.bench_remap [--objects N] [--body-length N]
+"""
+import argparse
+import copy
+import os
+import re
+import time
+from uuid import uuid4
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tests.settings')
+django.setup()
+
+from django_deepcopy import create_new_pks_for_objects  # noqa: E402
+
+RE_UUID = re.compile(
+    r'[0-9a-f]{8}\-[0-9a-f]{4}\-[0-9a-f]{4}\-[0-9a-f]{4}\-[0-9a-f]{12}'
+)
+
+
+def legacy_create_new_pks_for_objects(objs):
+    old_id_to_new_id_map = {}
+    for obj in objs:
+        if type(obj['pk']) is not int and obj['pk'] not in old_id_to_new_id_map:
+            old_id_to_new_id_map[obj['pk']] = str(uuid4())
+
+    def transform_pk(value):
+        if type(value) is str:
+            m = RE_UUID.match(value)
+            if m:
+                return value.replace(value, old_id_to_new_id_map[m.group(0)])
+        return value
+
+    for obj in objs:
+        for field, value in obj['fields'].items():
+            if type(value) is list:
+                obj['fields'][field] = [transform_pk(v) for v in value]
+            elif type(value) is str:
+                obj['fields'][field] = transform_pk(value)
+        obj['pk'] = old_id_to_new_id_map[obj['pk']]
+    return objs, old_id_to_new_id_map
+
+
+def make_objects(object_count, body_length):
+    post_id = str(uuid4())
+    body = ('lorem ipsum ' * (body_length // 12 + 1))[:body_length]
+    objs = [{'model': 'testapp.post', 'pk': post_id, 'fields': {'body': body}}]
+    objs += [
+        {
+            'model': 'testapp.comment',
+            'pk': str(uuid4()),
+            'fields': {'post': post_id, 'body': body},
+        }
+        for _ in range(object_count)
+    ]
+    return objs
+
+
+def timed(func, objs, repeat):
+    best = None
+    for _ in range(repeat):
+        objs_copy = copy.deepcopy(objs)
+        start = time.perf_counter()
+        func(objs_copy)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--objects', type=int, default=50_000)
+    parser.add_argument('--body-length', type=int, default=2_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    objs = make_objects(args.objects, args.body_length)
+    legacy = timed(legacy_create_new_pks_for_objects, objs, args.repeat)
+    plan = timed(lambda o: create_new_pks_for_objects(o, None), objs, args.repeat)
+    print(f'{args.objects} comments, body length {args.body_length}')
+    print(f'  regex scan: {legacy * 1000:8.1f} ms')
+    print(f'  remap plan: {plan * 1000:8.1f} ms ({legacy / plan:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
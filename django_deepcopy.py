@@ -1,14 +1,79 @@
+import hashlib
 import json
 import logging
-import re
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from contextlib import nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass
+from dataclasses import field as dataclass_field
+from functools import lru_cache, wraps
 from io import StringIO
-from uuid import uuid4
+from time import perf_counter
+from uuid import UUID, uuid4, uuid5
 
+from asgiref.sync import sync_to_async
 from django.apps import apps
-from django.contrib.admin.utils import NestedObjects
 from django.core import serializers
-from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
-from django.db.models import ForeignKey, ManyToManyField, OneToOneField
+from django.core.exceptions import ValidationError
+from django.core.serializers.base import deserialize_fk_value, deserialize_m2m_values
+from django.core.signals import setting_changed
+from django.db import (
+    DEFAULT_DB_ALIAS,
+    NotSupportedError,
+    connections,
+    router,
+    transaction,
+)
+from django.db.models import (
+    CASCADE,
+    BinaryField,
+    CharField,
+    JSONField,
+    ManyToManyRel,
+    Max,
+    Q,
+    TextField,
+    UUIDField,
+    Value,
+)
+from django.db.models.fields import AutoFieldMixin
+from django.db.models.signals import class_prepared, post_save, pre_save
+from django.dispatch import Signal
+
+# The native engine copies the collected model instances directly in memory,
+# while the JSON engine round-trips them through Django's serialization
+# framework like `dumpdata`/`loaddata` would (kept for compatibility).
+ENGINE_NATIVE = 'native'
+ENGINE_JSON = 'json'
+# The SQL engine copies the rows inside the database with `INSERT ... SELECT`
+# statements, falling back to the native engine for models it cannot handle.
+ENGINE_SQL = 'sql'
+ENGINE = ENGINE_NATIVE
+
+# With a `chunk_size`, copies are either made in one atomic block, or with an
+# atomic block (a savepoint, when called inside a transaction) per chunk.
+ATOMIC_COPY = 'copy'
+ATOMIC_CHUNK = 'chunk'
+
+# Resumable copies (with a `job_id`) record the chunks they have inserted, and the
+# primary keys allocated by the database, in these tables. The UUID primary keys of
+# their copies are derived from the old primary keys in a namespace per job.
+JOB_TABLE = 'django_deepcopy_job'
+JOB_PK_TABLE = 'django_deepcopy_job_pk'
+JOB_NAMESPACE = UUID('26058620-a5bc-465c-8a68-c2bc89a9b415')
+# Copies made with `persist_mapping=True` store their old -> new primary keys in
+# this table, for `django_deepcopy_sync()`
+MAPPING_TABLE = 'django_deepcopy_mapping'
+
+# With deferred constraint checks, the checks are disabled while inserting and the
+# tables written to are checked afterwards. With immediate constraint checks they
+# are kept enabled, relying on the inserts being made in dependency order.
+CONSTRAINT_CHECKS_DEFERRED = 'deferred'
+CONSTRAINT_CHECKS_IMMEDIATE = 'immediate'
+CONSTRAINT_CHECKS = CONSTRAINT_CHECKS_DEFERRED
 
 SERIALIZATION_FORMAT = 'json'
 EXCLUDED_APPS: list[str] = []
@@ -16,6 +81,45 @@ EXCLUDED_MODELS: list[str] = []
 USING = DEFAULT_DB_ALIAS
 USE_NATURAL_PRIMARY_KEYS = False
 USE_NATURAL_FOREIGN_KEYS = False
+# Maximum number of rows per INSERT statement. `None` lets the database backend
+# decide (e.g. SQLite's limit on the number of query parameters).
+BATCH_SIZE = None
+# Maximum number of keys per `__in` lookup when collecting objects. `None` lets
+# the database backend decide.
+COLLECT_BATCH_SIZE = None
+# Maximum number of copies that exist as model instances at once while inserting,
+# when the database backend would insert more rows per INSERT statement
+INSTANCE_BATCH_SIZE = 10000
+# Hard limits on the number of objects collected for a copy, in total and per
+# model. A copy exceeding them is aborted with `CopyLimitExceeded` before anything
+# is inserted. `None` means no limit.
+MAX_OBJECTS = None
+MAX_PER_MODEL = None
+# `plan_deepcopy()` selects every level of the cascade with a subquery on the
+# previous one. Levels nested deeper than this are turned into lists of primary
+# keys, so that the queries of deep trees (e.g. self-referential chains) stay small.
+MAX_COUNT_SUBQUERY_DEPTH = 4
+# With `DEFER_LARGE_FIELDS` the native engine leaves the large fields of the copied
+# objects (which are never changed by a copy) out of the collected rows, and copies
+# them inside the database once the copies are inserted, see
+# `copy_deferred_fields()`. The large fields are detected by their type (including
+# `CharField`s of at least `LARGE_CHAR_FIELD_LENGTH` characters) unless
+# `LARGE_FIELDS` lists them for the model as `{model_label: [field_name, ...]}`.
+DEFER_LARGE_FIELDS = False
+LARGE_FIELD_TYPES = (BinaryField, JSONField, TextField)
+LARGE_CHAR_FIELD_LENGTH = 1024
+LARGE_FIELDS: dict[str, list[str]] = {}
+# Filters applied to the queries collecting the objects of a model through the
+# cascade, as `{model_label: Q}` (or a dict of lookups), and cascading relations
+# that aren't followed at all, as `[(model_label, foreign_key_name), ...]`. Objects
+# filtered out -- and everything cascading from them -- are never fetched.
+COLLECT_FILTERS: dict = {}
+PRUNED_RELATIONS: list = []
+# The copies are inserted in bulk, sending `pre_save`/`post_save` for every copy
+# around the inserts (with `raw=True`, like `loaddata` does). Models with receivers
+# of those are copied in Python by the SQL engine. Without `SEND_MODEL_SIGNALS` only
+# `deepcopy_completed` is sent.
+SEND_MODEL_SIGNALS = True
 
 # from django.contrib import admin, auth
 # IGNORED_MODELS = [
@@ -26,247 +130,3674 @@ USE_NATURAL_FOREIGN_KEYS = False
 
 logger = logging.getLogger(__name__)
 
-# The techically correct pattern for UUID v4 is:
-# r'[0-9a-f]{8}\-[0-9a-f]{4}\-4[0-9a-f]{3}\-[89ab][0-9a-f]{3}\-[0-9a-f]{12}'
-#
-# However, we just do the naive thing here.
-RE_UUID_PATTERN = r'[0-9a-f]{8}\-[0-9a-f]{4}\-[0-9a-f]{4}\-[0-9a-f]{4}\-[0-9a-f]{12}'
-RE_UUID = re.compile(RE_UUID_PATTERN)
+# Sent once per root model when a copy is finished, see `send_deepcopy_completed()`.
+# Unlike with `pre_save`/`post_save`, receivers of this signal can do their work for
+# all the copies at once.
+deepcopy_completed = Signal()
+
+
+@dataclass(frozen=True)
+class DeepCopyOptions:
+    """
+    The settings of a copy. Unspecified options default to the module-level
+    settings above at the time the options are created.
+
+    Pass them as `options` to `django_deepcopy()` to change the settings of a
+    single copy -- unlike changing the module-level settings this is safe when
+    copies run concurrently in several threads or tasks.
+    """
+
+    using: str = dataclass_field(default_factory=lambda: USING)
+    engine: str = dataclass_field(default_factory=lambda: ENGINE)
+    batch_size: int = dataclass_field(default_factory=lambda: BATCH_SIZE)
+    collect_batch_size: int = dataclass_field(
+        default_factory=lambda: COLLECT_BATCH_SIZE
+    )
+    constraint_checks: str = dataclass_field(default_factory=lambda: CONSTRAINT_CHECKS)
+    serialization_format: str = dataclass_field(
+        default_factory=lambda: SERIALIZATION_FORMAT
+    )
+    excluded_apps: list = dataclass_field(default_factory=lambda: EXCLUDED_APPS)
+    excluded_models: list = dataclass_field(default_factory=lambda: EXCLUDED_MODELS)
+    use_natural_primary_keys: bool = dataclass_field(
+        default_factory=lambda: USE_NATURAL_PRIMARY_KEYS
+    )
+    use_natural_foreign_keys: bool = dataclass_field(
+        default_factory=lambda: USE_NATURAL_FOREIGN_KEYS
+    )
+    max_objects: int = dataclass_field(default_factory=lambda: MAX_OBJECTS)
+    max_per_model: int = dataclass_field(default_factory=lambda: MAX_PER_MODEL)
+    defer_large_fields: bool = dataclass_field(
+        default_factory=lambda: DEFER_LARGE_FIELDS
+    )
+    large_fields: dict = dataclass_field(default_factory=lambda: LARGE_FIELDS)
+    collect_filters: dict = dataclass_field(default_factory=lambda: COLLECT_FILTERS)
+    pruned_relations: list = dataclass_field(default_factory=lambda: PRUNED_RELATIONS)
+    send_model_signals: bool = dataclass_field(
+        default_factory=lambda: SEND_MODEL_SIGNALS
+    )
+    snapshot_cache: 'SnapshotCache' = dataclass_field(
+        default_factory=lambda: SNAPSHOT_CACHE
+    )
+
+
+class CopyLimitExceeded(Exception):
+    """
+    Raised while collecting the objects to copy when there are more than
+    `max_objects` objects, or more than `max_per_model` objects of one model.
+    """
+
+
+# The options of the copy in progress in the current thread or task
+current_options = ContextVar('django_deepcopy_options', default=None)
+
+
+def get_options():
+    options = current_options.get()
+    if options is None:
+        options = DeepCopyOptions()
+    return options
+
+
+def with_options(func):
+    """
+    Make the `options` keyword argument of `func` (or the module-level settings)
+    the options of every stage of the copy, see `get_options()`.
+    """
+
+    @wraps(func)
+    def wrapper(*args, options=None, **kwargs):
+        token = current_options.set(options or get_options())
+        try:
+            return func(*args, **kwargs)
+        finally:
+            current_options.reset(token)
+
+    return wrapper
+
+
+@dataclass
+class PhaseReport:
+    name: str
+    wall_time: float = 0.0
+    query_count: int = 0
+    query_time: float = 0.0
+
+
+@dataclass
+class CopyReport:
+    """
+    Instrumentation of a copy, filled in when passed as `report` to
+    `django_deepcopy()`. A phase lasts until the next one starts, and includes the
+    queries made on the database of the copy in the meantime.
+
+    `callbacks` are called with `(report, phase)` every time a phase has finished
+    and with `(report, None)` when the copy is finished, e.g. to forward the
+    numbers to a metrics system.
+    """
+
+    callbacks: list = dataclass_field(default_factory=list)
+    # `{name: PhaseReport}` in the order the phases started
+    phases: dict = dataclass_field(default_factory=dict)
+    # `{model label: number of copies inserted}`
+    object_counts: dict = dataclass_field(default_factory=dict)
+    bytes_serialized: int = 0
+    # The largest number of rows, objects and copies held in memory at once
+    peak_intermediate_size: int = 0
+    current_phase: PhaseReport = dataclass_field(default=None, repr=False)
+    phase_started_at: float = dataclass_field(default=None, repr=False)
+
+    def start_phase(self, name):
+        self.finish_phase()
+        self.current_phase = self.phases.setdefault(name, PhaseReport(name))
+        self.phase_started_at = perf_counter()
 
+    def finish_phase(self):
+        if self.current_phase is None:
+            return
+        phase, self.current_phase = self.current_phase, None
+        phase.wall_time += perf_counter() - self.phase_started_at
+        for callback in self.callbacks:
+            callback(self, phase)
 
-def get_all_related_objects(obj, ignored_models=None, dangling_models=None):
-    if ignored_models is None:
-        ignored_models = []
-    if dangling_models is None:
-        dangling_models = []
+    def finish(self):
+        self.finish_phase()
+        for callback in self.callbacks:
+            callback(self, None)
 
-    collector = NestedObjects(using=USING)
-    collector.collect([obj])
-    related_objects = collector.model_objs
-    all_models = list(set(related_objects.keys()))  # noqa: F841
+    def execute_wrapper(self, execute, sql, params, many, context):
+        # See `connection.execute_wrapper()`
+        started_at = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if self.current_phase is not None:
+                self.current_phase.query_count += 1
+                self.current_phase.query_time += perf_counter() - started_at
 
-    # `all_models` includes pseudo-models representing M2M relationships like `Group.member`
-    # which the real Django `dumpdata` does not output. It instead stores those M2M relations
-    # directly on the serialized `Group`-model. Therefore we use `dumped_models` instead, which
-    # doesn't include these pseudo-models.
-    dumped_models = set(apps.get_models())
-    if ignored_models:
-        dumped_models -= set(ignored_models)
 
-    if USE_NATURAL_FOREIGN_KEYS:
-        dumped_models = serializers.sort_dependencies(dumped_models, allow_cycles=True)
+# The report of the copy in progress in the current thread or task, if any
+current_report = ContextVar('django_deepcopy_report', default=None)
 
-    all_related_objects = {**related_objects}
 
-    for model in dangling_models:
-        dangling_related_objects = get_referenced_objects_of_type(
-            all_related_objects, model
+def with_report(func):
+    """
+    Fill in the `report` keyword argument of `func`, a `CopyReport`, if given.
+    """
+
+    @wraps(func)
+    def wrapper(*args, report=None, **kwargs):
+        if report is None:
+            return func(*args, **kwargs)
+        token = current_report.set(report)
+        try:
+            connection = connections[get_options().using]
+            with connection.execute_wrapper(report.execute_wrapper):
+                result = func(*args, **kwargs)
+            report.finish()
+            return result
+        finally:
+            current_report.reset(token)
+
+    return wrapper
+
+
+def report_phase(name):
+    report = current_report.get()
+    if report is not None:
+        report.start_phase(name)
+
+
+def report_copies(model, count):
+    report = current_report.get()
+    if report is not None and count:
+        label = model._meta.label
+        report.object_counts[label] = report.object_counts.get(label, 0) + count
+
+
+def report_intermediate_size(size):
+    report = current_report.get()
+    if report is not None:
+        report.peak_intermediate_size = max(report.peak_intermediate_size, size)
+
+
+def report_serialized_bytes(stream):
+    report = current_report.get()
+    if report is not None:
+        report.bytes_serialized += len(stream.getvalue().encode())
+
+
+@dataclass(frozen=True)
+class RemapPlan:
+    """
+    The fields of a model that hold primary keys, precomputed so that copying only
+    touches those fields (with a dict lookup each).
+
+    `fk_fields` and `m2m_fields` hold `(index, name, attname, related_model)` and
+    `(name, related_model)` where `index` is the position of the field in
+    `attnames` (the `concrete_fields` order) and `related_model` is concrete.
+    A primary key that is a relation (a `OneToOneField(primary_key=True)`) is in
+    `fk_fields` too, with `pk_related_model` as its related model.
+    `nullable_fk_names` are the names of the `fk_fields` that can be NULL.
+    `generic_fk_fields` hold `(content_type_index, object_id_index, object_id_field)`
+    for the `GenericForeignKey`s, whose object IDs are remapped according to the
+    content type of each row (see `remap_object_id()`).
+    """
+
+    model: type
+    attnames: tuple
+    pk_index: int
+    pk_name: str
+    # Whether copies get a new primary key -- UUID primary keys are generated by
+    # us, auto-incrementing primary keys are allocated by the database on insert,
+    # primary keys that are relations get the primary key of the copy of the
+    # related object, other primary keys are kept as-is.
+    generate_pk: bool
+    allocate_pk: bool
+    pk_related_model: type
+    fk_fields: tuple
+    m2m_fields: tuple
+    nullable_fk_names: frozenset
+    generic_fk_fields: tuple
+
+
+@lru_cache(maxsize=None)
+def get_remap_plan(model):
+    opts = model._meta
+    fk_fields = []
+    pk_index = None
+    for index, field in enumerate(opts.concrete_fields):
+        if field.primary_key:
+            pk_index = index
+        if field.is_relation and field.target_field.primary_key:
+            fk_fields.append(
+                (
+                    index,
+                    field.name,
+                    field.attname,
+                    field.related_model._meta.concrete_model,
+                )
+            )
+    m2m_fields = [
+        (field.name, field.related_model._meta.concrete_model)
+        for field in opts.many_to_many
+        if field.remote_field.through._meta.auto_created
+    ]
+    concrete_fields = list(opts.concrete_fields)
+    generic_fk_fields = [
+        (
+            concrete_fields.index(opts.get_field(field.ct_field)),
+            concrete_fields.index(opts.get_field(field.fk_field)),
+            opts.get_field(field.fk_field),
         )
-        all_related_objects = {**all_related_objects, **dangling_related_objects}
-        dumped_models.add(model)
+        for field in opts.private_fields
+        # `GenericForeignKey`s
+        if hasattr(field, 'ct_field') and hasattr(field, 'fk_field')
+    ]
+    return RemapPlan(
+        model=model,
+        attnames=tuple(field.attname for field in opts.concrete_fields),
+        pk_index=pk_index,
+        pk_name=opts.pk.name,
+        generate_pk=isinstance(opts.pk, UUIDField),
+        allocate_pk=isinstance(opts.pk, AutoFieldMixin),
+        pk_related_model=(
+            opts.pk.related_model._meta.concrete_model if opts.pk.is_relation else None
+        ),
+        fk_fields=tuple(fk_fields),
+        m2m_fields=tuple(m2m_fields),
+        nullable_fk_names=frozenset(
+            name for _, name, _, _ in fk_fields if opts.get_field(name).null
+        ),
+        generic_fk_fields=tuple(generic_fk_fields),
+    )
+
+
+@dataclass(frozen=True)
+class CopyPlan:
+    """
+    The model metadata needed to copy objects of `root_model`, computed once per
+    root model and options (see `get_copy_plan()`). All models are concrete.
+    """
+
+    root_model: type
+    # `{model: ((related_model, field), ...)}` for the foreign keys pointing to
+    # `model` that cascade on delete, i.e. the relations the collector follows
+    # (except for the `pruned_relations` of the options).
+    cascade_relations: dict
+    # The models whose objects are copied, in the order they are dumped
+    models: tuple
+    # `((dangling_model, ((model, field), ...)), ...)` for the fields of the
+    # collected models that reference each of the dangling models
+    dangling_references: tuple
+    remap_plans: dict
+    # `models` plus auto-created M2M through models, in dependency order
+    insert_order: tuple
+    db_tables: tuple
+
 
-    all_objs = [
-        obj for model in dumped_models for obj in all_related_objects.get(model, [])
+def get_cascade_relations(model):
+    return [
+        (rel.related_model._meta.concrete_model, rel.field)
+        for rel in model._meta.get_fields(include_hidden=True)
+        if rel.auto_created
+        and not rel.concrete
+        and (rel.one_to_one or rel.one_to_many)
+        and rel.on_delete is CASCADE
+        # M2M through rows are copied along with the M2M field, see
+        # `copy_m2m_relations()`
+        and not rel.related_model._meta.auto_created
+    ] + [
+        (field.related_model._meta.concrete_model, GenericCascade(field))
+        for field in get_generic_relations(model)
     ]
 
-    return all_objs
-
-
-def get_referenced_objects_of_type(all_related_objects, model, filtered_models=None):
-    all_models = apps.get_models()
-    object_fields = []
-
-    for m in all_models:
-        for field in m._meta.fields:
-            if isinstance(field, ForeignKey) and field.related_model == model:
-                object_fields.append((m, field))
-            elif isinstance(field, OneToOneField) and field.related_model == model:
-                object_fields.append((m, field))
-            elif isinstance(field, ManyToManyField) and field.related_model == model:
-                object_fields.append((m, field))
-            elif field.related_model == model:
-                raise 'Unknown related field'
-
-    object_ids = []
-    for m, field in object_fields:
-        for obj in all_related_objects.get(m, []):
-            if isinstance(field, ForeignKey) or isinstance(field, OneToOneField):
-                object_ids.append(getattr(obj, f'{field.name}_id'))
-            elif isinstance(field, ManyToManyField):
-                object_ids += getattr(obj, field.name).values_list('id', flat=True)
-    objects = model._base_manager.filter(pk__in=object_ids)
-    collector = NestedObjects(using='default')
-    collector.collect(objects)
-    related_objects = collector.model_objs
-    if filtered_models:
-        # Filter out all models not in `filtered_models`
-        return {m: v for m, v in related_objects.items() if m in filtered_models}
-    else:
-        return related_objects
+
+def get_generic_relations(model):
+    # `GenericRelation`s, whose objects `Collector` deletes along with `model`
+    # objects like those of cascading foreign keys
+    return [
+        field
+        for field in model._meta.private_fields
+        if hasattr(field, 'bulk_related_objects')
+    ]
+
+
+class GenericCascade:
+    """
+    A `GenericRelation` as a cascading relation (see `get_cascade_relations()`),
+    with the attributes of the foreign key it stands in for: its objects are
+    selected by their object ID field -- which is also its name in the
+    `pruned_relations` option -- and by content type, see `get_condition()`.
+    """
+
+    primary_key = False
+
+    def __init__(self, relation):
+        object_id_field = relation.related_model._meta.get_field(
+            relation.object_id_field_name
+        )
+        self.relation = relation
+        self.name = object_id_field.name
+        self.attname = object_id_field.attname
+        self.target_field = relation.model._meta.pk
+
+    def __eq__(self, other):
+        return isinstance(other, GenericCascade) and other.relation == self.relation
+
+    def __hash__(self):
+        return hash(self.relation)
+
+    def __repr__(self):
+        return f'<GenericCascade: {self.relation}>'
+
+    def get_condition(self, using):
+        content_type = get_content_type(
+            self.relation.model, using, self.relation.for_concrete_model
+        )
+        return Q(**{self.relation.content_type_field_name: content_type})
+
+
+def get_relation_condition(field, using):
+    # The condition that the objects of a cascading relation need to match besides
+    # the foreign key, or `None`
+    if isinstance(field, GenericCascade):
+        return field.get_condition(using)
+    return None
+
+
+def get_content_type(model, using, for_concrete_model=True):
+    # Imported lazily, `django.contrib.contenttypes` is only needed (and
+    # installed) when there are generic relations
+    content_type_model = apps.get_model('contenttypes', 'ContentType')
+    return content_type_model.objects.db_manager(using).get_for_model(
+        model, for_concrete_model=for_concrete_model
+    )
+
+
+def remap_object_id(content_type_id, object_id, object_id_field, old_id_to_new_id_map):
+    """
+    The object ID of a `GenericForeignKey` pointing to the copy of the object it
+    points to, if that is in `old_id_to_new_id_map` -- else `object_id` as-is.
+    """
+    if content_type_id is None or object_id is None:
+        return object_id
+    content_type_model = apps.get_model('contenttypes', 'ContentType')
+    model = (
+        content_type_model.objects.db_manager(get_options().using)
+        .get_for_id(content_type_id)
+        .model_class()
+    )
+    pk_map = model and old_id_to_new_id_map.get(model._meta.concrete_model)
+    if not pk_map:
+        return object_id
+    try:
+        pk = model._meta.pk.to_python(object_id)
+    except ValidationError:
+        return object_id
+    if pk not in pk_map:
+        return object_id
+    return object_id_field.to_python(pk_map[pk])
+
+
+def get_copy_plan(model, ignored_models=None, dangling_models=None):
+    options = get_options()
+    return build_copy_plan(
+        model._meta.concrete_model,
+        frozenset(m._meta.concrete_model for m in ignored_models or ()),
+        tuple(m._meta.concrete_model for m in dangling_models or ()),
+        options.use_natural_foreign_keys,
+        frozenset((label.lower(), name) for label, name in options.pruned_relations),
+    )
+
+
+@lru_cache(maxsize=256)
+def build_copy_plan(
+    root_model,
+    ignored_models,
+    dangling_models,
+    use_natural_foreign_keys,
+    pruned_relations=frozenset(),
+):
+    cascade_relations = {}
+    # `{related_model: [(model, field), ...]}` for the relation fields of the
+    # collected models, so that the references to each dangling model are looked up
+    # instead of scanning the fields of every model again
+    references = {}
+
+    def add_subtree(model):
+        queue = [model]
+        while queue:
+            model = queue.pop(0)
+            if model in cascade_relations:
+                continue
+            cascade_relations[model] = tuple(
+                (related_model, field)
+                for related_model, field in get_cascade_relations(model)
+                if (related_model._meta.label_lower, field.name) not in pruned_relations
+            )
+            queue += [related_model for related_model, _ in cascade_relations[model]]
+            for field in model._meta.concrete_fields + model._meta.many_to_many:
+                if field.is_relation:
+                    references.setdefault(
+                        field.related_model._meta.concrete_model, []
+                    ).append((model, field))
+
+    add_subtree(root_model)
+
+    dangling_references = []
+    for dangling_model in dangling_models:
+        referencing_fields = tuple(references.get(dangling_model, ()))
+        dangling_references.append((dangling_model, referencing_fields))
+        add_subtree(dangling_model)
+
+    # Objects of ignored models are still collected -- like when deleting -- so
+    # that objects further down the cascade are copied.
+    models = [model for model in cascade_relations if model not in ignored_models]
+    if use_natural_foreign_keys:
+        models = serializers.sort_dependencies([(None, models)], allow_cycles=True)
+
+    through_models = [
+        field.remote_field.through
+        for model in models
+        for field in model._meta.many_to_many
+        if field.remote_field.through._meta.auto_created
+    ]
+    insert_order = sort_models_by_dependencies(models + through_models)
+    return CopyPlan(
+        root_model=root_model,
+        cascade_relations=cascade_relations,
+        models=tuple(models),
+        dangling_references=tuple(dangling_references),
+        remap_plans={model: get_remap_plan(model) for model in insert_order},
+        insert_order=tuple(insert_order),
+        db_tables=tuple(model._meta.db_table for model in insert_order),
+    )
+
+
+def clear_copy_plan_cache(**kwargs):
+    get_remap_plan.cache_clear()
+    get_row_attnames.cache_clear()
+    build_copy_plan.cache_clear()
+
+
+# Copy plans are derived from the app registry, so they are rebuilt whenever a
+# model is (re)defined or the installed apps change.
+class_prepared.connect(clear_copy_plan_cache)
+
+
+def clear_copy_plan_cache_on_setting_changed(setting, **kwargs):
+    if setting == 'INSTALLED_APPS':
+        clear_copy_plan_cache()
+
+
+setting_changed.connect(clear_copy_plan_cache_on_setting_changed)
+
+
+def get_all_related_rows(
+    obj,
+    ignored_models=None,
+    dangling_models=None,
+    collect_batch_size=None,
+    keys_only=False,
+    deferred_fields=None,
+):
+    """
+    Collect the objects that would be deleted along with `obj` (and the subtrees of
+    the objects of `dangling_models` they reference).
+
+    Returns `{model: {pk: row}}` for the models of the copy plan, where each row is
+    a tuple of the values of the model's `concrete_fields` -- or only of its
+    primary and foreign keys with `keys_only` (see `get_row_attnames()`). The
+    `deferred_fields` (see `get_deferred_fields()`) are not fetched, the rows hold
+    placeholders for them instead.
+    """
+    plan = get_copy_plan(type(obj), ignored_models, dangling_models)
+
+    rows_by_model = {}
+    collect_rows(
+        plan.root_model,
+        [obj.pk],
+        plan.cascade_relations,
+        rows_by_model,
+        collect_batch_size=collect_batch_size,
+        keys_only=keys_only,
+        deferred_fields=deferred_fields,
+    )
+
+    for model, referencing_fields in plan.dangling_references:
+        referenced_pks = get_referenced_pks(
+            rows_by_model,
+            referencing_fields,
+            collect_batch_size=collect_batch_size,
+            keys_only=keys_only,
+        )
+        collect_rows(
+            model,
+            referenced_pks,
+            plan.cascade_relations,
+            rows_by_model,
+            collect_batch_size=collect_batch_size,
+            keys_only=keys_only,
+            deferred_fields=deferred_fields,
+        )
+
+    return {model: rows_by_model.get(model, {}) for model in plan.models}
+
+
+def collect_rows_for_roots(
+    roots,
+    ignored_models=None,
+    dangling_models=None,
+    collect_batch_size=None,
+    deferred_fields=None,
+):
+    """
+    Collect the rows of the related objects of each of `roots` like
+    `get_all_related_rows()`, but for all the roots at once: each level of the
+    cascade is fetched with the same queries for all the roots, and objects
+    related to several roots are only fetched once.
+
+    Returns a `{model: {pk: row}}` per root, in the order of `roots`.
+    """
+    plans = [
+        get_copy_plan(type(root), ignored_models, dangling_models) for root in roots
+    ]
+    cascade_relations = {}
+    for plan in plans:
+        cascade_relations.update(plan.cascade_relations)
+
+    rows_by_model = {}
+    # The indexes of the roots that each collected object is related to, as
+    # `{model: {pk: {index, ...}}}`
+    owners = {}
+
+    def collect(level):
+        # Like `collect_rows()`, where `level` is `{(model, field): {value: indexes}}`
+        # and objects already collected are visited again if they gain new owners.
+        while level:
+            next_level = {}
+            for (model, field), value_owners in level.items():
+                rows = fetch_new_rows(
+                    model,
+                    field,
+                    value_owners,
+                    rows_by_model,
+                    collect_batch_size,
+                    include_known=True,
+                    deferred_fields=deferred_fields,
+                )
+                attnames = get_row_attnames(model)
+                pk_index = attnames.index(model._meta.pk.attname)
+                value_index = attnames.index(field.attname)
+                model_owners = owners.setdefault(model, {})
+                gained = []
+                for row in rows:
+                    row_owners = model_owners.setdefault(row[pk_index], set())
+                    value = row[value_index]
+                    if isinstance(field, GenericCascade):
+                        # Object IDs may be stored as e.g. strings
+                        value = field.target_field.to_python(value)
+                    new_owners = value_owners[value] - row_owners
+                    if new_owners:
+                        row_owners |= new_owners
+                        gained.append((row, new_owners))
+                if not gained:
+                    continue
+                for related_model, related_field in cascade_relations.get(model, ()):
+                    target_index = attnames.index(related_field.target_field.attname)
+                    related_owners = next_level.setdefault(
+                        (related_model, related_field), {}
+                    )
+                    for row, new_owners in gained:
+                        related_owners.setdefault(row[target_index], set()).update(
+                            new_owners
+                        )
+            level = next_level
+
+    # The roots to copy per root model (which determines the plan)
+    indexes_by_model = {}
+    for index, (root, plan) in enumerate(zip(roots, plans)):
+        indexes_by_model.setdefault(plan.root_model, ({}, plan))[0].setdefault(
+            root.pk, set()
+        ).add(index)
+    collect(
+        {
+            (model, model._meta.pk): pk_owners
+            for model, (pk_owners, _) in indexes_by_model.items()
+        }
+    )
+    for pk_owners, plan in indexes_by_model.values():
+        indexes = set().union(*pk_owners.values())
+        for model, referencing_fields in plan.dangling_references:
+            referenced_owners = {}
+            for referencing_model, pk, referenced_pk in iter_references(
+                rows_by_model, referencing_fields, collect_batch_size
+            ):
+                row_owners = owners[referencing_model][pk] & indexes
+                if row_owners and referenced_pk is not None:
+                    referenced_owners.setdefault(referenced_pk, set()).update(
+                        row_owners
+                    )
+            collect({(model, model._meta.pk): referenced_owners})
+
+    return [
+        {
+            model: {
+                pk: row
+                for pk, row in rows_by_model.get(model, {}).items()
+                if index in owners[model][pk]
+            }
+            for model in plan.models
+        }
+        for index, plan in enumerate(plans)
+    ]
+
+
+def get_all_related_objects(
+    obj, ignored_models=None, dangling_models=None, collect_batch_size=None
+):
+    options = get_options()
+    rows_by_model = get_all_related_rows(
+        obj, ignored_models, dangling_models, collect_batch_size=collect_batch_size
+    )
+    return [
+        model.from_db(options.using, get_remap_plan(model).attnames, row)
+        for model, rows in rows_by_model.items()
+        for row in rows.values()
+    ]
+
+
+@lru_cache(maxsize=None)
+def get_row_attnames(model, keys_only=False):
+    """
+    The attnames of the values of the collected rows of `model`: all concrete
+    fields, or with `keys_only` only the primary key, the foreign keys and the
+    fields referenced by cascading foreign keys (in `concrete_fields` order).
+    """
+    plan = get_remap_plan(model)
+    if not keys_only:
+        return plan.attnames
+    key_attnames = {plan.attnames[plan.pk_index]}
+    key_attnames.update(attname for _, _, attname, _ in plan.fk_fields)
+    key_attnames.update(
+        field.target_field.attname for _, field in get_cascade_relations(model)
+    )
+    return tuple(attname for attname in plan.attnames if attname in key_attnames)
+
+
+def collect_rows(
+    model,
+    pks,
+    cascade_relations,
+    rows_by_model,
+    collect_batch_size=None,
+    keys_only=False,
+    deferred_fields=None,
+):
+    """
+    Collect the rows of the `model` objects with primary keys `pks` and of the
+    objects cascading from them into `rows_by_model`, one level of the cascade
+    at a time. Objects already in `rows_by_model` are not fetched again.
+
+    Unlike `django.contrib.admin.utils.NestedObjects` this only fetches the rows as
+    tuples, not as model instances, and doesn't build a graph for display.
+    """
+    level = {
+        model: fetch_new_rows(
+            model,
+            model._meta.pk,
+            pks,
+            rows_by_model,
+            collect_batch_size,
+            keys_only,
+            deferred_fields=deferred_fields,
+        )
+    }
+    while level:
+        next_level = {}
+        for model, rows in level.items():
+            attnames = get_row_attnames(model, keys_only)
+            for related_model, field in cascade_relations.get(model, ()):
+                target_index = attnames.index(field.target_field.attname)
+                new_rows = fetch_new_rows(
+                    related_model,
+                    field,
+                    [row[target_index] for row in rows],
+                    rows_by_model,
+                    collect_batch_size,
+                    keys_only,
+                    deferred_fields=deferred_fields,
+                )
+                if new_rows:
+                    next_level.setdefault(related_model, []).extend(new_rows)
+        level = next_level
+
+
+def fetch_new_rows(
+    model,
+    field,
+    values,
+    rows_by_model,
+    collect_batch_size=None,
+    keys_only=False,
+    include_known=False,
+    deferred_fields=None,
+):
+    # Fetches the rows of `model` where `field` is in `values` that are not in
+    # `rows_by_model` yet, and adds them. With `include_known` the matching rows
+    # that were collected already are returned as well.
+    options = get_options()
+    attnames = get_row_attnames(model, keys_only)
+    # Objects are filtered when collected through the cascade, not when they are
+    # collected by primary key (the copied objects, and the dangling references)
+    condition = None if field.primary_key else get_collect_filter(model)
+    relation_condition = get_relation_condition(field, options.using)
+    if relation_condition is not None:
+        condition = relation_condition & (condition or Q())
+    columns = attnames
+    if deferred_fields and model in deferred_fields:
+        # The database returns placeholders for the deferred fields, so that the
+        # rows have the same shape
+        placeholders = {
+            field.attname: Value(get_placeholder(field), output_field=field)
+            for field in deferred_fields[model]
+        }
+        columns = [placeholders.get(attname, attname) for attname in attnames]
+    pk_index = attnames.index(model._meta.pk.attname)
+    model_rows = rows_by_model.setdefault(model, {})
+    values = [value for value in dict.fromkeys(values) if value is not None]
+    new_rows = []
+    if field.primary_key:
+        if include_known:
+            new_rows += [model_rows[value] for value in values if value in model_rows]
+        values = [value for value in values if value not in model_rows]
+    if not values:
+        return new_rows
+
+    batch_size = collect_batch_size or connections[options.using].ops.bulk_batch_size(
+        [field], values
+    )
+    for batch in chunked(values, batch_size):
+        queryset = model._base_manager.using(options.using).filter(
+            **{f'{field.attname}__in': batch}
+        )
+        if condition is not None:
+            queryset = queryset.filter(condition)
+        rows = queryset.values_list(*columns)
+        for row in rows:
+            pk = row[pk_index]
+            if pk not in model_rows:
+                model_rows[pk] = row
+                new_rows.append(row)
+            elif include_known:
+                new_rows.append(model_rows[pk])
+        check_copy_limits(model, rows_by_model)
+    return new_rows
+
+
+def get_collect_filter(model):
+    # The `collect_filters` of the options for `model` as a `Q`, or `None`
+    collect_filters = {
+        label.lower(): condition
+        for label, condition in get_options().collect_filters.items()
+    }
+    condition = collect_filters.get(model._meta.label_lower)
+    if isinstance(condition, dict):
+        condition = Q(**condition)
+    return condition
+
+
+def check_copy_limits(model, rows_by_model):
+    # Aborts the copy as soon as the collected rows exceed the limits of the options,
+    # i.e. before the remaining objects are collected
+    options = get_options()
+    if options.max_per_model is not None:
+        count = len(rows_by_model.get(model, ()))
+        if count > options.max_per_model:
+            raise CopyLimitExceeded(
+                f'More than {options.max_per_model} {model._meta.label} objects '
+                f'to copy (max_per_model)'
+            )
+    if options.max_objects is not None:
+        count = sum(len(rows) for rows in rows_by_model.values())
+        if count > options.max_objects:
+            raise CopyLimitExceeded(
+                f'More than {options.max_objects} objects to copy (max_objects)'
+            )
+
+
+def get_deferred_fields(models, unique_field_generators=None):
+    """
+    `{model: (field, ...)}` of the large fields of `models` to leave out of the
+    collected rows when the `defer_large_fields` option is set: the fields listed in
+    the `large_fields` option for the model, or else the fields of the
+    `LARGE_FIELD_TYPES` and long `CharField`s that aren't unique. Keys and fields
+    with `unique_field_generators` are always collected.
+    """
+    options = get_options()
+    if not options.defer_large_fields:
+        return {}
+    if unique_field_generators is None:
+        unique_field_generators = {}
+    deferred_fields = {}
+    for model in models:
+        opts = model._meta
+        names = options.large_fields.get(opts.label_lower)
+        fields = tuple(
+            field
+            # Fields of parent models are in the tables of the parents
+            for field in opts.local_concrete_fields
+            if not field.primary_key
+            and not field.is_relation
+            and not getattr(field, 'generated', False)
+            and (opts.label_lower, field.name) not in unique_field_generators
+            and (field.name in names if names is not None else is_large_field(field))
+        )
+        if fields:
+            deferred_fields[model] = fields
+    return deferred_fields
+
+
+def is_large_field(field):
+    if field.unique:
+        return False
+    if isinstance(field, LARGE_FIELD_TYPES):
+        return True
+    return (
+        isinstance(field, CharField)
+        and field.max_length is not None
+        and field.max_length >= LARGE_CHAR_FIELD_LENGTH
+    )
+
+
+def get_placeholder(field):
+    # A value the column of a deferred field accepts until the copied value is set,
+    # e.g. `''` and `b''` for text and binary fields
+    if isinstance(field, JSONField) and not field.has_default() and not field.null:
+        return {}
+    return field.get_default()
+
+
+def get_referenced_pks(
+    rows_by_model, referencing_fields, collect_batch_size=None, keys_only=False
+):
+    # Returns the primary keys referenced by the fields `referencing_fields`
+    # (`((model, field), ...)`) of the collected rows
+    return [
+        referenced_pk
+        for _, _, referenced_pk in iter_references(
+            rows_by_model, referencing_fields, collect_batch_size, keys_only
+        )
+    ]
+
+
+def iter_references(
+    rows_by_model, referencing_fields, collect_batch_size=None, keys_only=False
+):
+    # Yields `(model, pk, referenced_pk)` for the references of the fields
+    # `referencing_fields` (`((model, field), ...)`) of the collected rows. The
+    # references of many-to-many fields are fetched from the through table, with
+    # one query per field (per batch of `collect_batch_size` objects).
+    options = get_options()
+    connection = connections[options.using]
+    for model, field in referencing_fields:
+        rows = rows_by_model.get(model, {})
+        if not rows:
+            continue
+        if field.many_to_many:
+            through = field.remote_field.through
+            source_field = through._meta.get_field(field.m2m_field_name())
+            target_attname = through._meta.get_field(
+                field.m2m_reverse_field_name()
+            ).attname
+            pks = list(rows)
+            batch_size = collect_batch_size or connection.ops.bulk_batch_size(
+                [source_field], pks
+            )
+            for batch in chunked(pks, batch_size):
+                for pk, referenced_pk in (
+                    through._base_manager.using(options.using)
+                    .filter(**{f'{source_field.attname}__in': batch})
+                    .values_list(source_field.attname, target_attname)
+                ):
+                    yield model, pk, referenced_pk
+        elif field.target_field.primary_key:
+            index = get_row_attnames(model, keys_only).index(field.attname)
+            for pk, row in rows.items():
+                yield model, pk, row[index]
+
+
+class BatchFieldGenerator:
+    """
+    Base class for `unique_field_generators` that generate the values of a field
+    for all the copies of a model at once, e.g. to check them for uniqueness with
+    one query. Plain callables in `unique_field_generators` get one value at a
+    time instead.
+    """
+
+    def generate_batch(self, model, field, values, using):
+        """
+        Return the new values of `field` for the copies of the `model` objects
+        with the `values`, in the same order. `using` is the database alias of
+        the copy.
+        """
+        raise NotImplementedError
+
+
+class UniqueFieldGenerator(BatchFieldGenerator):
+    """
+    Generate unique values with `candidate(value, attempt)`, e.g. for slugs:
+
+        UniqueFieldGenerator(lambda slug, attempt: f'{slug}-{attempt + 2}')
+
+    The candidates of all the copies are checked against the database with one
+    `field__in` query (per batch of the backend's size), and only the values that
+    are taken already are generated again, with the next `attempt`.
+    """
+
+    def __init__(self, candidate, max_attempts=100):
+        self.candidate = candidate
+        self.max_attempts = max_attempts
+
+    def generate_batch(self, model, field, values, using):
+        connection = connections[using]
+        new_values = list(values)
+        pending = list(range(len(values)))
+        # The values generated so far, which must not be generated again
+        generated = set()
+        for attempt in range(self.max_attempts):
+            candidates = {
+                index: self.candidate(values[index], attempt) for index in pending
+            }
+            unique_candidates = list(dict.fromkeys(candidates.values()))
+            taken = set()
+            for batch in chunked(
+                unique_candidates,
+                connection.ops.bulk_batch_size([field], unique_candidates),
+            ):
+                taken.update(
+                    model._base_manager.using(using)
+                    .filter(**{f'{field.attname}__in': batch})
+                    .values_list(field.attname, flat=True)
+                )
+            pending = []
+            for index, candidate in candidates.items():
+                if candidate in taken or candidate in generated:
+                    pending.append(index)
+                else:
+                    new_values[index] = candidate
+                    generated.add(candidate)
+            if not pending:
+                return new_values
+        raise ValueError(
+            f'No unique value for {model._meta.label}.{field.name} found in '
+            f'{self.max_attempts} attempts'
+        )
+
+
+def generate_field_values(generator, model, field, values):
+    # Returns the values of `field` for the copies of the objects with the `values`,
+    # see `unique_field_generators`
+    if isinstance(generator, BatchFieldGenerator):
+        return list(
+            generator.generate_batch(model, field, list(values), get_options().using)
+        )
+    return [generator(value) for value in values]
 
 
 def create_new_pks_for_objects(objs, unique_field_generators):
     if unique_field_generators is None:
         unique_field_generators = {}
 
+    # The fields to transform, per serialized model label
+    field_plans = {}
+
+    def get_field_plan(model_label):
+        if model_label not in field_plans:
+            plan = get_remap_plan(apps.get_model(model_label))
+            generated = {
+                name for label, name in unique_field_generators if label == model_label
+            }
+            # The object IDs of generic foreign keys are remapped like foreign
+            # keys, as the primary keys in the mapping are unique UUIDs
+            fk_names = [name for _, name, _, _ in plan.fk_fields] + [
+                field.name for _, _, field in plan.generic_fk_fields
+            ]
+            field_plans[model_label] = (
+                plan.generate_pk,
+                [name for name in fk_names if name not in generated],
+                [name for name, _ in plan.m2m_fields if name not in generated],
+            )
+        return field_plans[model_label]
+
     old_id_to_new_id_map = {}
     for obj in objs:
         old_pk = obj['pk']
-        if type(old_pk) is int:
-            # Skip integer primary keys
-            continue
-        elif old_pk in old_id_to_new_id_map:
+        if old_pk in old_id_to_new_id_map:
             continue
-        else:
+        elif get_field_plan(obj['model'])[0]:
             old_id_to_new_id_map[old_pk] = str(uuid4())
 
+    # The generators get all the values of a field at once, see
+    # `BatchFieldGenerator`
+    for (model_label, name), generator in unique_field_generators.items():
+        model_objs = [
+            obj for obj in objs if obj['model'] == model_label and name in obj['fields']
+        ]
+        if not model_objs:
+            continue
+        model = apps.get_model(model_label)
+        values = generate_field_values(
+            generator,
+            model,
+            model._meta.get_field(name),
+            [obj['fields'][name] for obj in model_objs],
+        )
+        for obj, value in zip(model_objs, values):
+            obj['fields'][name] = value
+
     def transform_pk(value):
+        # Natural keys are lists and are left as-is. Keys that point outside of
+        # the copied objects are also left as-is.
         if type(value) is str:
-            m = RE_UUID.match(value)
-            if m:
-                try:
-                    old_id = m.group(0)
-                    new_id = old_id_to_new_id_map[old_id]
-                    return value.replace(value, new_id)
-                except KeyError:
-                    raise
+            return old_id_to_new_id_map.get(value, value)
         return value
 
     for obj in objs:
         old_pk = obj['pk']
+        _, fk_names, m2m_names = get_field_plan(obj['model'])
+        fields = obj['fields']
 
-        # Transform reference field to use the new primary keys
-        for field, value in obj['fields'].items():
-            if (obj['model'], field) in unique_field_generators:
-                obj['fields'][field] = unique_field_generators[(obj['model'], field)](
-                    obj['fields'][field]
-                )
-            elif type(value) is list:
-                obj['fields'][field] = [transform_pk(v) for v in obj['fields'][field]]
-            elif type(value) is str:
-                obj['fields'][field] = transform_pk(obj['fields'][field])
-            # if (
-            #     type(value) is list
-            #     and value
-            #     and type(value[0]) is str
-            #     and RE_UUID.match(value[0])
-            # ):
-            #     for i, subvalue in enumerate(value):
-            #         m = RE_UUID.match(subvalue)
-            #         new_id = old_id_to_new_id_map[m.group(0)]
-            #         [i] = subvalue.replace(subvalue, new_id)
-            # if type(value) is str:
-            #     m = RE_UUID.match(value)
-            #     if m:
-            #         new_id = old_id_to_new_id_map[m.group(0)]
-            #         obj['fields'][field] = value.replace(value, new_id)
+        # Transform reference fields to use the new primary keys
+        for name in fk_names:
+            if name in fields:
+                fields[name] = transform_pk(fields[name])
+        for name in m2m_names:
+            if name in fields:
+                fields[name] = [transform_pk(v) for v in fields[name]]
 
         # Use new primary key -- we transform this last to ease debugging
         # so that the old primary key is available if an exception is raised
         # when transforming the fields.
-        if type(old_pk) is str:
-            # Only transform string primary keys (assumed to be UUIDs here)
+        if old_pk in old_id_to_new_id_map:
             obj['pk'] = old_id_to_new_id_map[old_pk]
 
     return objs, old_id_to_new_id_map
 
 
-def insert_serialized_objects_into_db(objs):
-    deserialization_stream = StringIO()
-    json.dump(objs, deserialization_stream)
-    deserialization_stream.seek(0)
-
-    copied_objects = serializers.deserialize(
-        SERIALIZATION_FORMAT,
-        deserialization_stream,
-        using=USING,
-        # ignorenonexistent=self.ignore,
-        handle_forward_references=True,
+def is_excluded_model(model):
+    options = get_options()
+    return (
+        model._meta.app_config in options.excluded_apps
+        or model._meta.app_label in options.excluded_apps
+        or model in options.excluded_models
     )
 
-    # From Django's built-in `loaddata`-command
-    connection = connections[USING]
-    objs_with_deferred_fields = []
-    logger.debug('Starting atomic transaction')
-    with transaction.atomic(using=USING):
-        with connection.constraint_checks_disabled():
-            for obj in copied_objects:
-                if (
-                    obj.object._meta.app_config in EXCLUDED_APPS
-                    or type(obj.object) in EXCLUDED_MODELS
-                ):
-                    continue
-                if router.allow_migrate_model(USING, obj.object.__class__):
-                    # We use `model.objects.bulk_create()` instead of `obj.save()`
-                    # to ensure that we fail on duplicate primary keys
-                    # - this can happen for e.g.
-                    #   through-"models" which have integer primary keys. In that case, we want to make
-                    #   sure we don't overwrite existing groups, which
-                    #   `obj.save()` does without erroring.
-                    if type(obj.object.pk) is int and obj.object._meta.label in (
-                        # Add integer PK models here
-                    ):
-                        # We assume here that there are no external references (e.g. ForeignKeys) to integer
-                        # primary keys, and simply create new primary keys here without updating references.
-                        obj.object.pk = None
-                    logger.debug(f'  Bulk creating {obj.object}...')
-                    obj.object._meta.model._base_manager.bulk_create([obj.object])
-                    # We _also_ need to call `obj.save()` -- `obj` here is a `DeserializedObject` which
-                    # contains and saves `ManyToMany`-relations like `Course.students` and `Course.teachers`.
-                    logger.debug('  Done')
-                    logger.debug(f'  Saving {obj.object}...')
-                    obj.save(using=USING)
-                    logger.debug('  Done')
-                if obj.deferred_fields:
-                    objs_with_deferred_fields.append(obj)
-
-            logger.debug('  Saving deferred fields...')
-            for obj in objs_with_deferred_fields:
-                obj.save_deferred_fields(using=USING)
-            logger.debug('  Done')
-    logger.debug('  Done')
 
-    # Since we disabled constraint checks, we must manually check for
-    # any invalid keys that might have been added
-    dumped_models = set(apps.get_models())
-    table_names = [model._meta.db_table for model in dumped_models]
-    logger.debug('Checking constraints...')
-    connection.check_constraints(table_names=table_names)
-    logger.debug('Done')
+def chunked(values, size):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i : i + size]
 
 
-def django_deepcopy(
-    obj, ignored_models=None, dangling_models=None, unique_field_generators=None
+class CopyBatch:
+    """
+    Unsaved copies of objects of one model, as rows: tuples of the values of the
+    model's `concrete_fields` (see `RemapPlan.attnames`), along with the primary
+    keys of the objects they are copies of (`None` for through-rows). Model
+    instances are only created when the rows are inserted, see
+    `bulk_insert_copies()`.
+    """
+
+    __slots__ = ('model', 'old_pks', 'rows')
+
+    def __init__(self, model, old_pks, rows):
+        self.model = model
+        self.old_pks = old_pks
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __repr__(self):
+        return f'<CopyBatch: {len(self)} {self.model._meta.label}>'
+
+
+def copy_rows(
+    rows_by_model,
+    unique_field_generators,
+    batch_size=None,
+    old_id_to_new_id_map=None,
+    copy_m2m=True,
+    m2m_rows=None,
+    generated_values=None,
 ):
+    """
+    Create unsaved copies of the collected rows (`{model: {pk: row}}`) with new
+    primary keys, and with foreign keys pointing into the copied set rewritten to
+    the new primary keys. The keys are remapped a column at a time.
 
-    ###### Step 1: Collect all objects related to `obj` #########
-    all_objs = get_all_related_objects(obj, ignored_models, dangling_models)
+    Returns the copies as a `CopyBatch` per model (including batches for
+    auto-created many-to-many through models), and a mapping
+    `{model: {old_pk: new_pk}}`. Auto-incrementing primary keys are only added to
+    the mapping by `bulk_insert_copies()` when the copies are inserted.
 
-    ###### Step 2: Serialize all collected objects #########
-    object_count = len(all_objs)
-    serialization_stream = StringIO()
-    serializers.serialize(
-        SERIALIZATION_FORMAT,
-        # sorted(all_related_objects, key=lambda obj: model_order[obj.model]),
-        all_objs,
-        use_natural_foreign_keys=USE_NATURAL_FOREIGN_KEYS,
-        use_natural_primary_keys=USE_NATURAL_PRIMARY_KEYS,
-        stream=serialization_stream,
-        object_count=object_count,
+    An existing `old_id_to_new_id_map` is extended with the new primary keys, and
+    used to rewrite foreign keys to objects that were not collected in
+    `rows_by_model`. The batches are returned in the order of `rows_by_model`,
+    followed by the through-rows unless `copy_m2m` is false. The through-rows are
+    fetched unless they are given as `m2m_rows` (see `fetch_m2m_rows()`). The
+    values of the `unique_field_generators` are generated unless they are given as
+    `generated_values` (see `generate_unique_field_values()`).
+    """
+    if generated_values is None:
+        generated_values = generate_unique_field_values(
+            [rows_by_model], unique_field_generators
+        )[0]
+
+    if old_id_to_new_id_map is None:
+        old_id_to_new_id_map = {}
+    generate_pks(rows_by_model, old_id_to_new_id_map)
+
+    batches = []
+    for model, rows in rows_by_model.items():
+        if not rows:
+            continue
+        plan = get_remap_plan(model)
+        columns = list(zip(*rows.values()))
+        if plan.allocate_pk:
+            columns[plan.pk_index] = [None] * len(rows)
+        else:
+            pk_map = old_id_to_new_id_map[model]
+            columns[plan.pk_index] = [
+                pk_map.get(value, value) for value in columns[plan.pk_index]
+            ]
+        for index, _, _, related_model in plan.fk_fields:
+            fk_map = old_id_to_new_id_map.get(related_model)
+            if fk_map:
+                columns[index] = [fk_map.get(value, value) for value in columns[index]]
+        for content_type_index, index, object_id_field in plan.generic_fk_fields:
+            columns[index] = [
+                remap_object_id(
+                    content_type_id, value, object_id_field, old_id_to_new_id_map
+                )
+                for content_type_id, value in zip(
+                    columns[content_type_index], columns[index]
+                )
+            ]
+        for index, values in generated_values.get(model, {}).items():
+            columns[index] = values
+        batches.append(CopyBatch(model, list(rows), list(zip(*columns))))
+
+    if copy_m2m:
+        if m2m_rows is None:
+            m2m_rows = fetch_m2m_rows(rows_by_model, batch_size=batch_size)
+        batches += copy_m2m_rows(m2m_rows, rows_by_model, old_id_to_new_id_map)
+
+    return batches, old_id_to_new_id_map
+
+
+def generate_unique_field_values(rows_by_models, unique_field_generators):
+    """
+    Generate the values of the `unique_field_generators` (from the original values)
+    for several sets of collected rows at once -- e.g. the copies of
+    `django_deepcopy_many()` -- so that a generator checking the values against the
+    database doesn't give the same value to the copies in different sets.
+
+    Returns `{model: {field_index: values}}` per set of rows, for `copy_rows()`.
+    """
+    generated_values = [{} for _ in rows_by_models]
+    if not unique_field_generators:
+        return generated_values
+    models = dict.fromkeys(
+        model for rows_by_model in rows_by_models for model in rows_by_model
     )
-    serialization_stream.seek(0)
-    objs = json.load(serialization_stream)
+    for model in models:
+        for index, field in enumerate(model._meta.concrete_fields):
+            generator = unique_field_generators.get(
+                (model._meta.label_lower, field.name)
+            )
+            if generator is None:
+                continue
+            values = []
+            sizes = []
+            for rows_by_model in rows_by_models:
+                rows = rows_by_model.get(model, {})
+                values += [row[index] for row in rows.values()]
+                sizes.append(len(rows))
+            if not values:
+                continue
+            new_values = generate_field_values(generator, model, field, values)
+            start = 0
+            for set_values, size in zip(generated_values, sizes):
+                if size:
+                    set_values.setdefault(model, {})[index] = new_values[
+                        start : start + size
+                    ]
+                start += size
+    return generated_values
 
-    ###### Step 3: Create new IDs/pks for the objects #########
-    objs, old_new_mapping = create_new_pks_for_objects(
-        objs, unique_field_generators=unique_field_generators
+
+def generate_pks(rows_by_model, old_id_to_new_id_map, namespace=None):
+    # Generates random UUID primary keys, or with a `namespace` UUIDs derived from
+    # the old primary keys (so that the same keys are generated again)
+    for model, rows in rows_by_model.items():
+        pk_map = old_id_to_new_id_map.setdefault(model, {})
+        if get_remap_plan(model).generate_pk:
+            for old_pk in rows:
+                if old_pk in pk_map:
+                    continue
+                if namespace is None:
+                    pk_map[old_pk] = uuid4()
+                else:
+                    pk_map[old_pk] = uuid5(namespace, f'{model._meta.label}:{old_pk}')
+    map_related_pks(rows_by_model, old_id_to_new_id_map)
+
+
+def map_related_pks(rows_by_model, old_id_to_new_id_map):
+    # Adds the primary keys that are relations to the mapping, as the new primary
+    # keys of the related copies -- when those are known already, auto-incrementing
+    # primary keys are added by `resolve_allocated_pks()` on insert instead
+    for model, rows in rows_by_model.items():
+        related_model = get_remap_plan(model).pk_related_model
+        if related_model is None:
+            continue
+        pk_map = old_id_to_new_id_map.setdefault(model, {})
+        related_pk_map = old_id_to_new_id_map.get(related_model, {})
+        for old_pk in rows:
+            if old_pk in related_pk_map:
+                pk_map[old_pk] = related_pk_map[old_pk]
+
+
+def copy_m2m_relations(rows_by_model, old_id_to_new_id_map, batch_size=None):
+    """
+    Create unsaved copies of the through-rows of the many-to-many relations of the
+    collected rows (`{model: {pk: row}}`), with one query per many-to-many field.
+
+    Like the serializers we only copy M2M relations with an auto-created through
+    model -- explicit through models are copied as regular models.
+    """
+    return copy_m2m_rows(
+        fetch_m2m_rows(rows_by_model, batch_size=batch_size),
+        rows_by_model,
+        old_id_to_new_id_map,
     )
 
-    # Get the PK of the copy of `obj`
-    new_obj_id = old_new_mapping[str(obj.id)]
 
-    ###### Step 4: Load serialized objects and insert into the database #########
-    insert_serialized_objects_into_db(objs)
+def fetch_m2m_rows(rows_by_model, batch_size=None):
+    # Fetches the through-rows of the auto-created many-to-many relations of the
+    # collected rows as `[(field, through, source_attname, target_attname,
+    # [(source, target), ...]), ...]`
+    options = get_options()
+    connection = connections[options.using]
+    m2m_rows = []
+    for model, rows in rows_by_model.items():
+        if is_excluded_model(model):
+            continue
+        old_pks = list(rows)
+        for field in model._meta.many_to_many:
+            through = field.remote_field.through
+            if not through._meta.auto_created:
+                continue
+            source_attname = through._meta.get_field(field.m2m_field_name()).attname
+            target_attname = through._meta.get_field(
+                field.m2m_reverse_field_name()
+            ).attname
+            query_batch_size = batch_size or connection.ops.bulk_batch_size(
+                [source_attname], old_pks
+            )
+            through_rows = []
+            for pks in chunked(old_pks, query_batch_size):
+                through_rows += (
+                    through._base_manager.using(options.using)
+                    .filter(**{f'{source_attname}__in': pks})
+                    .values_list(source_attname, target_attname)
+                )
+            m2m_rows.append(
+                (field, through, source_attname, target_attname, through_rows)
+            )
+    return m2m_rows
 
-    new_obj = obj._meta.model.objects.get(id=new_obj_id)
-    return new_obj
+
+def copy_m2m_rows(m2m_rows, rows_by_model, old_id_to_new_id_map):
+    # Creates unsaved copies of the through-rows `m2m_rows` (see `fetch_m2m_rows()`)
+    # of the objects in `rows_by_model`, as a `CopyBatch` per relation
+    batches = []
+    for field, through, source_attname, target_attname, through_rows in m2m_rows:
+        model = field.model._meta.concrete_model
+        rows = rows_by_model.get(model, {})
+        attnames = get_remap_plan(through).attnames
+        source_index = attnames.index(source_attname)
+        target_index = attnames.index(target_attname)
+        source_map = old_id_to_new_id_map.get(model, {})
+        target_map = old_id_to_new_id_map.get(
+            field.related_model._meta.concrete_model, {}
+        )
+        new_rows = []
+        for old_source, old_target in through_rows:
+            if old_source in rows:
+                values = [None] * len(attnames)
+                values[source_index] = source_map.get(old_source, old_source)
+                values[target_index] = target_map.get(old_target, old_target)
+                new_rows.append(tuple(values))
+        if new_rows:
+            batches.append(CopyBatch(through, [None] * len(new_rows), new_rows))
+    return batches
+
+
+def get_model_dependencies(models, nullable=True):
+    """
+    `{model: {related_model, ...}}` for the foreign keys between `models`, leaving
+    out self-references -- and the nullable foreign keys unless `nullable`. The
+    models with a `GenericRelation` to a model count as its related models, as the
+    object IDs can only be rewritten once those are inserted.
+    """
+    model_set = set(models)
+    dependencies = {
+        model: {
+            field.related_model._meta.concrete_model
+            for field in model._meta.concrete_fields
+            if field.is_relation
+            and (nullable or not field.null)
+            and field.related_model._meta.concrete_model in model_set
+            and field.related_model._meta.concrete_model is not model
+        }
+        for model in models
+    }
+    for model in model_set:
+        for field in get_generic_relations(model):
+            related_model = field.related_model._meta.concrete_model
+            if related_model in model_set and related_model is not model:
+                dependencies[related_model].add(model)
+    return dependencies
+
+
+def sort_by_dependencies(items, dependencies):
+    # Kahn's algorithm, keeping the original order among the items that are ready
+    # at the same time. Items left in a cycle are appended in their original order.
+    dependencies = {item: set(deps) for item, deps in dependencies.items()}
+    sorted_items = []
+    remaining = list(items)
+    while remaining:
+        ready = [item for item in remaining if not dependencies[item]]
+        if not ready:
+            sorted_items += remaining
+            break
+        sorted_items += ready
+        remaining = [item for item in remaining if dependencies[item]]
+        for deps in dependencies.values():
+            deps.difference_update(ready)
+    return sorted_items
+
+
+def sort_models_by_dependencies(models):
+    """
+    Order `models` so that models come after the models their foreign keys point
+    to.
+
+    Models in a dependency cycle are kept together, after the models the cycle
+    depends on and before the models depending on it. Within a cycle the models
+    are ordered by their non-nullable foreign keys, so that only the nullable
+    foreign keys (and self-references) point to copies that are inserted later
+    -- those are inserted as NULL and set afterwards, see
+    `resolve_allocated_pks()`. What is still cyclic is kept in its original order.
+    """
+    models = list(models)
+    dependencies = get_model_dependencies(models)
+
+    # The models each model depends on, directly or indirectly
+    reachable = {}
+    for model in models:
+        seen = set()
+        stack = list(dependencies[model])
+        while stack:
+            related_model = stack.pop()
+            if related_model not in seen:
+                seen.add(related_model)
+                stack += dependencies[related_model]
+        reachable[model] = seen
+
+    # The strongly connected components, i.e. the cycles and the single models
+    # that aren't part of any, which are ordered like the models
+    components = []
+    component_indexes = {}
+    for model in models:
+        if model in component_indexes:
+            continue
+        component = [
+            other
+            for other in models
+            if other is model
+            or (other in reachable[model] and model in reachable[other])
+        ]
+        for other in component:
+            component_indexes[other] = len(components)
+        components.append(component)
+
+    component_dependencies = {
+        index: {
+            component_indexes[related_model]
+            for model in component
+            for related_model in dependencies[model]
+        }
+        - {index}
+        for index, component in enumerate(components)
+    }
+    sorted_models = []
+    for index in sort_by_dependencies(range(len(components)), component_dependencies):
+        component = components[index]
+        if len(component) > 1:
+            component = sort_by_dependencies(
+                component, get_model_dependencies(component, nullable=False)
+            )
+        sorted_models += component
+    return sorted_models
+
+
+def bulk_insert_objects(
+    objs,
+    batch_size=None,
+    old_pks=None,
+    old_id_to_new_id_map=None,
+    insert_order=None,
+    resolve_references=True,
+):
+    """
+    Insert the unsaved model instances `objs` with chunked `bulk_create()`s per
+    model, in dependency order. See `bulk_insert_copies()`, which this calls with
+    the instances converted to batches -- so the instances themselves are not
+    saved.
+
+    When `old_pks` (the primary keys of the objects that `objs` are copies of) and
+    `old_id_to_new_id_map` are given, auto-incrementing primary keys allocated by
+    the database are added to the mapping, and foreign keys to such objects are
+    rewritten before the objects referencing them are inserted.
+
+    Returns the models that were inserted into.
+    """
+    if old_pks is None:
+        old_pks = [None] * len(objs)
+    batches = {}
+    for old_pk, obj in zip(old_pks, objs):
+        model = obj._meta.concrete_model
+        if model not in batches:
+            batches[model] = CopyBatch(model, [], [])
+        batches[model].old_pks.append(old_pk)
+        batches[model].rows.append(
+            tuple(getattr(obj, attname) for attname in get_remap_plan(model).attnames)
+        )
+    return bulk_insert_copies(
+        [(list(batches.values()), old_id_to_new_id_map)],
+        batch_size=batch_size,
+        insert_order=insert_order,
+        resolve_references=resolve_references,
+    )
+
+
+def bulk_insert_copies(
+    copy_sets, batch_size=None, insert_order=None, resolve_references=True
+):
+    """
+    Insert several independent sets of copies, `[(batches,
+    old_id_to_new_id_map), ...]` as returned by `copy_rows()`, with chunked
+    `bulk_create()`s per model shared by all the sets. Model instances are only
+    created for one `bulk_create()` at a time (of at most `INSTANCE_BATCH_SIZE`
+    objects).
+
+    When an `old_id_to_new_id_map` is given, auto-incrementing primary keys
+    allocated by the database are added to it, and (unless `resolve_references`
+    is false) foreign keys to such copies are rewritten before the copies
+    referencing them are inserted.
+
+    `insert_order` is a precomputed dependency order of the models (see
+    `CopyPlan`), models not in it are sorted and inserted last.
+
+    Returns the models that were inserted into.
+    """
+    options = get_options()
+    connection = connections[options.using]
+    # Per set: `({model: [batch, ...]}, old_id_to_new_id_map)`
+    sets = []
+    for batches, old_id_to_new_id_map in copy_sets:
+        batches_by_model = {}
+        for batch in batches:
+            if len(batch):
+                batches_by_model.setdefault(batch.model, []).append(batch)
+        sets.append((batches_by_model, old_id_to_new_id_map))
+
+    # References to copies that have not been inserted yet (i.e. dependency cycles),
+    # see `update_forward_references()`
+    forward_references = []
+    inserted_models = []
+
+    models = dict.fromkeys(
+        model for batches_by_model, _ in sets for model in batches_by_model
+    )
+    if insert_order is None:
+        insert_order = ()
+    insert_order = [model for model in insert_order if model in models]
+    insert_order += sort_models_by_dependencies(
+        model for model in models if model not in insert_order
+    )
+    # Only the primary keys of the copies that are added to a mapping are needed,
+    # e.g. not those of through-rows
+    check_allocated_pks_are_returned(
+        model
+        for model in insert_order
+        if any(
+            old_id_to_new_id_map is not None
+            and any(
+                old_pk is not None
+                for batch in batches_by_model.get(model, ())
+                for old_pk in batch.old_pks
+            )
+            for batches_by_model, old_id_to_new_id_map in sets
+        )
+    )
+
+    for model in insert_order:
+        if is_excluded_model(model):
+            continue
+        if not router.allow_migrate_model(options.using, model):
+            continue
+        plan = get_remap_plan(model)
+        # The rows of all the sets, with their old primary keys and mappings
+        rows = []
+        old_pks = []
+        pk_maps = []
+        for batches_by_model, old_id_to_new_id_map in sets:
+            for batch in batches_by_model.get(model, ()):
+                if old_id_to_new_id_map is not None and resolve_references:
+                    forward_references += resolve_allocated_pks(
+                        batch, batches_by_model, old_id_to_new_id_map
+                    )
+                rows += batch.rows
+                old_pks += batch.old_pks
+                pk_map = None
+                if old_id_to_new_id_map is not None:
+                    pk_map = old_id_to_new_id_map.setdefault(model, {})
+                pk_maps += [pk_map] * len(batch)
+
+        # The batches of the backend, so that creating the instances a batch at a
+        # time doesn't add queries
+        fields = model._meta.concrete_fields
+        if plan.allocate_pk:
+            fields = [field for field in fields if not field.primary_key]
+        step = batch_size or min(
+            connection.ops.bulk_batch_size(fields, rows), INSTANCE_BATCH_SIZE
+        )
+        step = max(step, 1)
+
+        # We use `model.objects.bulk_create()` instead of `obj.save()`
+        # to ensure that we fail on duplicate primary keys
+        # - this can happen for e.g.
+        #   through-"models" which have integer primary keys. In that case, we want to make
+        #   sure we don't overwrite existing groups, which
+        #   `obj.save()` does without erroring.
+        logger.debug(f'  Bulk creating {len(rows)} {model._meta.label}...')
+        send_signals = sends_model_signals(model)
+        for start in range(0, len(rows), step):
+            objs = [model(*row) for row in rows[start : start + step]]
+            if send_signals:
+                for obj in objs:
+                    pre_save.send(
+                        sender=model,
+                        instance=obj,
+                        raw=True,
+                        using=options.using,
+                        update_fields=None,
+                    )
+            model._base_manager.using(options.using).bulk_create(
+                objs, batch_size=batch_size
+            )
+            if send_signals:
+                for obj in objs:
+                    post_save.send(
+                        sender=model,
+                        instance=obj,
+                        created=True,
+                        update_fields=None,
+                        raw=True,
+                        using=options.using,
+                    )
+            if plan.allocate_pk:
+                for old_pk, pk_map, obj in zip(
+                    old_pks[start : start + step], pk_maps[start : start + step], objs
+                ):
+                    if old_pk is not None and pk_map is not None:
+                        pk_map[old_pk] = obj.pk
+        logger.debug('  Done')
+        inserted_models.append(model)
+        report_copies(model, len(rows))
+
+    if forward_references:
+        update_forward_references(forward_references, batch_size)
+    return inserted_models
+
+
+def sends_model_signals(model):
+    # Whether `pre_save`/`post_save` are sent for the copies of `model`: like
+    # `DeserializedObject.save()`, but not for the rows of auto-created through
+    # models (which `loaddata` adds with `set()`), and not when nothing receives them
+    return (
+        get_options().send_model_signals
+        and not model._meta.auto_created
+        and (pre_save.has_listeners(model) or post_save.has_listeners(model))
+    )
+
+
+def resolve_allocated_pks(batch, batches_by_model, old_id_to_new_id_map):
+    """
+    Rewrite the foreign keys of the copies in `batch` that point to copied objects
+    with auto-incrementing primary keys. Returns the references to copies that have
+    not been inserted yet (i.e. dependency cycles) -- those are inserted as NULL, or
+    keep pointing to the original object when the foreign key isn't nullable, until
+    `update_forward_references()` is called.
+
+    The object IDs of generic foreign keys are rewritten as well, but only those
+    pointing to copies that are inserted already.
+    """
+    model = batch.model
+    plan = get_remap_plan(model)
+    fk_fields = [
+        (index, name, related_model)
+        for index, name, _, related_model in plan.fk_fields
+        if get_remap_plan(related_model).allocate_pk
+        and related_model in batches_by_model
+    ]
+    if not fk_fields and not plan.generic_fk_fields:
+        return []
+
+    forward_references = []
+    own_pk_map = old_id_to_new_id_map.setdefault(model, {})
+    columns = list(zip(*batch.rows))
+    allocated_pk_maps = {
+        related_model: old_id_to_new_id_map.get(related_model, {})
+        for related_model in batches_by_model
+        if get_remap_plan(related_model).allocate_pk
+    }
+    for content_type_index, index, object_id_field in plan.generic_fk_fields:
+        columns[index] = [
+            remap_object_id(content_type_id, value, object_id_field, allocated_pk_maps)
+            for content_type_id, value in zip(
+                columns[content_type_index], columns[index]
+            )
+        ]
+    for index, name, related_model in fk_fields:
+        pk_map = old_id_to_new_id_map.setdefault(related_model, {})
+        pending_pks = {
+            pk
+            for related_batch in batches_by_model[related_model]
+            for pk in related_batch.old_pks
+        }
+        column = list(columns[index])
+        for row_index, value in enumerate(column):
+            if value in pk_map:
+                column[row_index] = pk_map[value]
+                if index == plan.pk_index:
+                    own_pk_map[batch.old_pks[row_index]] = pk_map[value]
+            elif value in pending_pks:
+                if name in plan.nullable_fk_names:
+                    column[row_index] = None
+                forward_references.append(
+                    (
+                        model,
+                        name,
+                        own_pk_map,
+                        batch.old_pks[row_index],
+                        pk_map,
+                        value,
+                    )
+                )
+        columns[index] = column
+    batch.rows = list(zip(*columns))
+    return forward_references
+
+
+def check_allocated_pks_are_returned(models):
+    """
+    Raise `NotSupportedError` when copies of `models` get auto-incrementing primary
+    keys, but the database backend cannot return the primary keys allocated by a
+    bulk insert (e.g. MySQL) -- those are needed to rewrite the references to the
+    copies, and cannot be reserved safely while other inserts may be running.
+    """
+    options = get_options()
+    connection = connections[options.using]
+    if connection.features.can_return_rows_from_bulk_insert:
+        return
+    for model in models:
+        # The primary keys of auto-created through models are never referenced
+        if get_remap_plan(model).allocate_pk and not model._meta.auto_created:
+            raise NotSupportedError(
+                f'Copies of {model._meta.label} get auto-incrementing primary keys, '
+                f'which requires a database backend that returns the primary keys '
+                f'of bulk inserts (e.g. PostgreSQL, SQLite 3.35+ or MariaDB 10.5+)'
+            )
+
+
+def update_forward_references(forward_references, batch_size):
+    # The references are `(model, field_name, pk_map, old_pk, related_pk_map,
+    # old_value)`: the copy of the `model` object `old_pk` (with the mapping
+    # `pk_map`) should reference the copy of `old_value` (with the mapping
+    # `related_pk_map`). Only the primary key and the field are needed to update it.
+    options = get_options()
+    objs_by_field = {}
+    for model, name, pk_map, old_pk, related_pk_map, old_value in forward_references:
+        obj = model(
+            **{
+                model._meta.pk.attname: pk_map.get(old_pk, old_pk),
+                model._meta.get_field(name).attname: related_pk_map[old_value],
+            }
+        )
+        objs_by_field.setdefault((model, name), []).append(obj)
+
+    for (model, name), objs in objs_by_field.items():
+        logger.debug(f'  Updating {len(objs)} {model._meta.label}.{name}...')
+        model._base_manager.using(options.using).bulk_update(
+            objs, [name], batch_size=batch_size
+        )
+        logger.debug('  Done')
+
+
+def get_m2m_through_objects(deserialized_objects):
+    through_objs = []
+    for obj in deserialized_objects:
+        if is_excluded_model(obj.object._meta.concrete_model):
+            continue
+        for field_name, target_pks in (obj.m2m_data or {}).items():
+            field = obj.object._meta.get_field(field_name)
+            through = field.remote_field.through
+            source_attname = through._meta.get_field(field.m2m_field_name()).attname
+            target_attname = through._meta.get_field(
+                field.m2m_reverse_field_name()
+            ).attname
+            through_objs += [
+                through(**{source_attname: obj.object.pk, target_attname: target_pk})
+                for target_pk in target_pks
+            ]
+    return through_objs
+
+
+def insert_serialized_objects_into_db(
+    objs, batch_size=None, constraint_checks=CONSTRAINT_CHECKS_DEFERRED
+):
+    options = get_options()
+    deserialization_stream = StringIO()
+    json.dump(objs, deserialization_stream)
+    deserialization_stream.seek(0)
+
+    copied_objects = list(
+        serializers.deserialize(
+            options.serialization_format,
+            deserialization_stream,
+            using=options.using,
+            # ignorenonexistent=self.ignore,
+            handle_forward_references=True,
+        )
+    )
+
+    # From Django's built-in `loaddata`-command
+    connection = connections[options.using]
+    logger.debug('Starting atomic transaction')
+    with transaction.atomic(using=options.using):
+        with disable_constraint_checks(connection, constraint_checks):
+            # `DeserializedObject.save()` would save the `ManyToMany`-relations like
+            # `Course.students` and `Course.teachers` with a `set()` per object,
+            # so we insert the rows of the through models in bulk instead.
+            inserted_models = bulk_insert_objects(
+                [obj.object for obj in copied_objects]
+                + get_m2m_through_objects(copied_objects),
+                batch_size=batch_size,
+            )
+
+            inserted_models += update_deferred_fields(
+                copied_objects, batch_size=batch_size
+            )
+    logger.debug('  Done')
+
+    check_constraints(connection, inserted_models, constraint_checks)
+
+
+def update_deferred_fields(deserialized_objects, batch_size=None):
+    """
+    Set the fields that were deferred while deserializing `deserialized_objects`
+    (references by natural key to objects that weren't inserted yet) -- they were
+    inserted as NULL. Instead of saving every object with deferred fields like
+    `DeserializedObject.save_deferred_fields()` does, the foreign keys are updated
+    with one chunked `bulk_update()` per field, and the many-to-many relations are
+    inserted in bulk.
+
+    Returns the models that were written to.
+    """
+    options = get_options()
+    objs_by_field = {}
+    through_objs = []
+    for obj in deserialized_objects:
+        if not obj.deferred_fields:
+            continue
+        obj.m2m_data = {}
+        for field, value in obj.deferred_fields.items():
+            if isinstance(field.remote_field, ManyToManyRel):
+                obj.m2m_data[field.name] = deserialize_m2m_values(
+                    field, value, options.using, handle_forward_references=False
+                )
+            else:
+                value = deserialize_fk_value(
+                    field, value, options.using, handle_forward_references=False
+                )
+                setattr(obj.object, field.attname, value)
+                objs_by_field.setdefault(
+                    (obj.object._meta.concrete_model, field.name), []
+                ).append(obj.object)
+        through_objs += get_m2m_through_objects([obj])
+
+    for (model, name), objs in objs_by_field.items():
+        logger.debug(f'  Updating {len(objs)} {model._meta.label}.{name}...')
+        model._base_manager.using(options.using).bulk_update(
+            objs, [name], batch_size=batch_size
+        )
+        logger.debug('  Done')
+    models = list(dict.fromkeys(model for model, _ in objs_by_field))
+    if through_objs:
+        models += bulk_insert_objects(through_objs, batch_size=batch_size)
+    return models
+
+
+def insert_copied_objects_into_db(
+    copy_sets,
+    batch_size=None,
+    insert_order=None,
+    constraint_checks=CONSTRAINT_CHECKS_DEFERRED,
+    deferred_fields=None,
+):
+    # `copy_sets` are `[(batches, old_id_to_new_id_map), ...]` as
+    # returned by `copy_rows()`, see `bulk_insert_copies()`
+    options = get_options()
+    connection = connections[options.using]
+    logger.debug('Starting atomic transaction')
+    with transaction.atomic(using=options.using):
+        with disable_constraint_checks(connection, constraint_checks):
+            inserted_models = bulk_insert_copies(
+                copy_sets, batch_size=batch_size, insert_order=insert_order
+            )
+            if deferred_fields:
+                copy_deferred_fields(
+                    connection,
+                    deferred_fields,
+                    [old_id_to_new_id_map for _, old_id_to_new_id_map in copy_sets],
+                    batch_size=batch_size,
+                )
+    logger.debug('  Done')
+
+    check_constraints(connection, inserted_models, constraint_checks)
+
+
+def get_constraint_checks(constraint_checks):
+    if constraint_checks is None:
+        constraint_checks = get_options().constraint_checks
+    if constraint_checks not in (
+        CONSTRAINT_CHECKS_DEFERRED,
+        CONSTRAINT_CHECKS_IMMEDIATE,
+    ):
+        raise ValueError(f'Unknown constraint checks mode: {constraint_checks!r}')
+    return constraint_checks
+
+
+def disable_constraint_checks(connection, constraint_checks):
+    if constraint_checks == CONSTRAINT_CHECKS_IMMEDIATE:
+        return nullcontext()
+    return connection.constraint_checks_disabled()
+
+
+def check_constraints(connection, models, constraint_checks=CONSTRAINT_CHECKS_DEFERRED):
+    # Since we disabled constraint checks, we must manually check for any invalid
+    # keys that might have been added -- only the tables we wrote to can have any
+    if constraint_checks == CONSTRAINT_CHECKS_IMMEDIATE:
+        return
+    table_names = list(dict.fromkeys(model._meta.db_table for model in models))
+    if not table_names:
+        return
+    logger.debug(f'Checking constraints of {len(table_names)} tables...')
+    connection.check_constraints(table_names=table_names)
+    logger.debug('Done')
+
+
+def copy_in_chunks(
+    obj,
+    ignored_models=None,
+    dangling_models=None,
+    unique_field_generators=None,
+    batch_size=None,
+    chunk_size=1000,
+    atomic=ATOMIC_COPY,
+    constraint_checks=CONSTRAINT_CHECKS_DEFERRED,
+    job_id=None,
+):
+    """
+    Copy `obj` and its related objects as a pipeline over chunks of at most
+    `chunk_size` objects of one model, so that only the old -> new primary key
+    mapping is held in memory in full.
+
+    The primary keys of the objects are collected first. Then, model by model in
+    dependency order, each chunk is fetched, copied and inserted before the next
+    one is fetched. With `atomic=ATOMIC_CHUNK` every chunk is inserted in its own
+    atomic block. Returns the old -> new primary key mapping.
+
+    With a `job_id` the copy is resumable: the new UUID primary keys are derived
+    from `job_id` and the old primary keys, and every inserted chunk is recorded in
+    the job tables along with it. Copying again with the same `job_id` skips the
+    chunks that were inserted already.
+    """
+    options = get_options()
+    if atomic not in (ATOMIC_COPY, ATOMIC_CHUNK):
+        raise ValueError(f'Unknown atomic mode: {atomic!r}')
+    plan = get_copy_plan(type(obj), ignored_models, dangling_models)
+    connection = connections[options.using]
+    finished_steps = set()
+    old_id_to_new_id_map = {}
+    namespace = None
+    if job_id is not None:
+        create_job_tables(connection)
+        finished_steps = get_finished_job_steps(connection, job_id)
+        load_pk_mapping(
+            connection, JOB_PK_TABLE, 'job_id', job_id, old_id_to_new_id_map
+        )
+        namespace = uuid5(JOB_NAMESPACE, str(job_id))
+
+    ###### Pass 1: Collect the primary keys and generate the new ones #########
+    report_phase('collect')
+    old_pks_by_model = {
+        # Sorted for a resumable copy, so that it is split into the same chunks
+        model: dict.fromkeys(sorted(key_rows) if job_id is not None else key_rows)
+        for model, key_rows in get_all_related_rows(
+            obj,
+            ignored_models,
+            dangling_models,
+            collect_batch_size=options.collect_batch_size,
+            keys_only=True,
+        ).items()
+        if key_rows
+    }
+    generate_pks(old_pks_by_model, old_id_to_new_id_map, namespace)
+    if finished_steps:
+        # The copies inserted by an earlier run may reference the original objects
+        # (see `resolve_chunk_references()`), so they are collected along with them
+        for model, old_pks in old_pks_by_model.items():
+            pk_map = old_id_to_new_id_map[model]
+            for pk in set(pk_map.values()).intersection(old_pks):
+                del old_pks[pk]
+                pk_map.pop(pk, None)
+
+    def chunks():
+        # Yields `(model, source_model, step, pks)` per chunk in dependency order,
+        # where `step` names the chunk in the job table. The model is `None` for the
+        # through-rows of the M2M relations of `source_model`, which are copied last.
+        for model in plan.insert_order:
+            old_pks = old_pks_by_model.get(model, ())
+            for index, pks in enumerate(chunked(old_pks, chunk_size)):
+                yield model, model, f'{model._meta.label}:{index}', pks
+        for model, old_pks in old_pks_by_model.items():
+            for index, pks in enumerate(chunked(old_pks, chunk_size)):
+                yield None, model, f'{model._meta.label}.m2m:{index}', pks
+
+    def fetch_chunk(model, source_model, pks):
+        if model is None:
+            return {source_model: dict.fromkeys(pks)}
+        rows_by_model = {}
+        fetch_new_rows(
+            model, model._meta.pk, pks, rows_by_model, options.collect_batch_size
+        )
+        return rows_by_model[model]
+
+    # References to copies that have not been inserted yet, see
+    # `resolve_chunk_references()`
+    forward_references = []
+    finished_models = set()
+    inserted_pks = {}
+    inserted_models = set()
+
+    def insert_chunk(model, rows):
+        if model is None:
+            batches = copy_m2m_relations(
+                rows, old_id_to_new_id_map, batch_size=batch_size
+            )
+            inserted_models.update(
+                bulk_insert_copies([(batches, None)], batch_size=batch_size)
+            )
+            return
+        (batch,), _ = copy_rows(
+            {model: rows},
+            unique_field_generators,
+            batch_size=batch_size,
+            old_id_to_new_id_map=old_id_to_new_id_map,
+            copy_m2m=False,
+        )
+        report_intermediate_size(key_count + len(rows) + len(batch))
+        forward_references.extend(
+            resolve_chunk_references(
+                model,
+                rows,
+                batch,
+                old_pks_by_model,
+                old_id_to_new_id_map,
+                finished_models,
+                inserted_pks,
+            )
+        )
+        inserted_models.update(
+            bulk_insert_copies(
+                [([batch], old_id_to_new_id_map)],
+                batch_size=batch_size,
+                resolve_references=False,
+            )
+        )
+        inserted_pks.update(rows)
+        if job_id is not None and get_remap_plan(model).allocate_pk:
+            pk_map = old_id_to_new_id_map[model]
+            save_pk_mapping(
+                connection,
+                JOB_PK_TABLE,
+                'job_id',
+                job_id,
+                model,
+                [(pk, pk_map[pk]) for pk in rows],
+            )
+
+    insert_index = {model: index for index, model in enumerate(plan.insert_order)}
+
+    def skip_chunk(model, source_model, pks):
+        # The copies of a chunk inserted by an earlier run of the job may still
+        # reference copies inserted after them, which are updated once everything is
+        # inserted -- so those references are resolved again.
+        if model is None or 'references' in finished_steps:
+            return
+        if any(
+            related_model in old_pks_by_model
+            and insert_index.get(related_model, -1) >= insert_index[model]
+            for _, _, _, related_model in get_remap_plan(model).fk_fields
+        ):
+            rows = fetch_chunk(model, source_model, pks)
+            (batch,), _ = copy_rows(
+                {model: rows},
+                unique_field_generators,
+                batch_size=batch_size,
+                old_id_to_new_id_map=old_id_to_new_id_map,
+                copy_m2m=False,
+            )
+            forward_references.extend(
+                resolve_chunk_references(
+                    model,
+                    rows,
+                    batch,
+                    old_pks_by_model,
+                    old_id_to_new_id_map,
+                    finished_models,
+                    inserted_pks,
+                )
+            )
+        inserted_pks.update(dict.fromkeys(pks))
+
+    ###### Pass 2: Fetch, copy and insert chunk by chunk #########
+    report_phase('insert')
+    key_count = sum(len(old_pks) for old_pks in old_pks_by_model.values())
+    logger.debug('Starting atomic transaction')
+    with (
+        transaction.atomic(using=options.using)
+        if atomic == ATOMIC_COPY
+        else nullcontext()
+    ):
+        with disable_constraint_checks(connection, constraint_checks):
+            current_model = None
+            for model, source_model, step, pks in chunks():
+                if model is not current_model:
+                    finished_models.add(current_model)
+                    current_model = model
+                    inserted_pks = {}
+                if step in finished_steps:
+                    logger.debug(f'  Skipping the inserted chunk {step}')
+                    skip_chunk(model, source_model, pks)
+                    continue
+                rows = fetch_chunk(model, source_model, pks)
+                logger.debug(f'  Copying a chunk of {len(rows)} objects...')
+                with (
+                    transaction.atomic(using=options.using)
+                    if atomic == ATOMIC_CHUNK
+                    else nullcontext()
+                ):
+                    insert_chunk(model, rows)
+                    if job_id is not None:
+                        finish_job_step(connection, job_id, step)
+                logger.debug('  Done')
+
+            if (forward_references or job_id is not None) and (
+                'references' not in finished_steps
+            ):
+                with transaction.atomic(using=options.using):
+                    if forward_references:
+                        update_forward_references(forward_references, batch_size)
+                    if job_id is not None:
+                        finish_job_step(connection, job_id, 'references')
+    logger.debug('  Done')
+
+    check_constraints(connection, inserted_models, constraint_checks)
+
+    return old_id_to_new_id_map
+
+
+def create_job_tables(connection):
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {qn(JOB_TABLE)} '
+            f'(job_id varchar(255) NOT NULL, step varchar(255) NOT NULL, '
+            f'PRIMARY KEY (job_id, step))'
+        )
+    create_pk_mapping_table(connection, JOB_PK_TABLE, 'job_id')
+
+
+def create_pk_mapping_table(connection, table, key_column):
+    # A table of old -> new primary keys, per model and `key_column`
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {qn(table)} '
+            f'({key_column} varchar(255) NOT NULL, model varchar(255) NOT NULL, '
+            f'old_pk varchar(255) NOT NULL, new_pk varchar(255) NOT NULL, '
+            f'PRIMARY KEY ({key_column}, model, old_pk))'
+        )
+
+
+def get_finished_job_steps(connection, job_id):
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT step FROM {qn(JOB_TABLE)} WHERE job_id = %s', [str(job_id)]
+        )
+        return {step for (step,) in cursor.fetchall()}
+
+
+def finish_job_step(connection, job_id, step):
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {qn(JOB_TABLE)} (job_id, step) VALUES (%s, %s)',
+            [str(job_id), step],
+        )
+
+
+def load_pk_mapping(connection, table, key_column, key, old_id_to_new_id_map):
+    """
+    Add the old -> new primary keys stored for `key` in the table `table` (see
+    `create_pk_mapping_table()`) to `old_id_to_new_id_map`.
+    """
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT model, old_pk, new_pk FROM {qn(table)} '
+            f'WHERE {key_column} = %s',
+            [str(key)],
+        )
+        for label, old_pk, new_pk in cursor.fetchall():
+            model = apps.get_model(label)
+            pk = model._meta.pk
+            old_id_to_new_id_map.setdefault(model, {})[pk.to_python(old_pk)] = (
+                pk.to_python(new_pk)
+            )
+
+
+def save_pk_mapping(connection, table, key_column, key, model, pks):
+    # Stores the `(old_pk, new_pk)` pairs `pks` of copies of `model` for `key`
+    qn = connection.ops.quote_name
+    label = model._meta.label
+    with connection.cursor() as cursor:
+        for batch in chunked(pks, 500):
+            cursor.executemany(
+                f'INSERT INTO {qn(table)} ({key_column}, model, old_pk, new_pk) '
+                f'VALUES (%s, %s, %s, %s)',
+                [(str(key), label, str(old), str(new)) for old, new in batch],
+            )
+
+
+@with_options
+def delete_deepcopy_job(job_id):
+    """
+    Delete the progress recorded for the resumable copy `job_id`, e.g. once it has
+    finished.
+    """
+    connection = connections[get_options().using]
+    qn = connection.ops.quote_name
+    create_job_tables(connection)
+    with connection.cursor() as cursor:
+        for table in (JOB_TABLE, JOB_PK_TABLE):
+            cursor.execute(f'DELETE FROM {qn(table)} WHERE job_id = %s', [str(job_id)])
+
+
+def resolve_chunk_references(
+    model,
+    rows,
+    batch,
+    old_pks_by_model,
+    old_id_to_new_id_map,
+    finished_models,
+    inserted_pks,
+):
+    """
+    Rewrite the foreign keys of the copies in `batch` (of the chunk `rows` of
+    `model`) that point to other copies. References to copies that haven't been
+    inserted yet are inserted as NULL (or pointed back to the original objects when
+    the foreign key isn't nullable), so that every chunk is consistent on its own.
+    Those are returned as references to be updated with
+    `update_forward_references()` once everything is inserted.
+
+    `inserted_pks` are the old primary keys of the chunks of `model` inserted so
+    far, and `finished_models` the models whose chunks are all inserted.
+    """
+    forward_references = []
+    columns = None
+    own_pk_map = old_id_to_new_id_map[model]
+    plan = get_remap_plan(model)
+    for index, name, _, related_model in plan.fk_fields:
+        pending_pks = old_pks_by_model.get(related_model)
+        if not pending_pks:
+            continue
+        if columns is None:
+            columns = [list(column) for column in zip(*batch.rows)]
+        column = columns[index]
+        pk_map = old_id_to_new_id_map[related_model]
+        allocate_pk = get_remap_plan(related_model).allocate_pk
+        for row_index, (old_pk, row) in enumerate(rows.items()):
+            old_value = row[index]
+            if old_value not in pending_pks:
+                continue
+            if related_model is model:
+                is_inserted = old_value in inserted_pks or (
+                    # Inserted along with the chunk
+                    old_value in rows
+                    and not allocate_pk
+                )
+            else:
+                is_inserted = related_model in finished_models
+            if is_inserted:
+                column[row_index] = pk_map[old_value]
+                if index == plan.pk_index:
+                    own_pk_map[old_pk] = pk_map[old_value]
+            else:
+                column[row_index] = (
+                    None if name in plan.nullable_fk_names else old_value
+                )
+                forward_references.append(
+                    (model, name, own_pk_map, old_pk, pk_map, old_value)
+                )
+    if columns is not None:
+        batch.rows = list(zip(*columns))
+    return forward_references
+
+
+def can_copy_in_database(model, unique_field_generators):
+    """
+    Whether the copies of `model` can be made with `INSERT ... SELECT` -- i.e.
+    without computing any values (other than keys) in Python.
+    """
+    plan = get_remap_plan(model)
+    opts = model._meta
+    return (
+        # Auto-incrementing primary keys are allocated by `bulk_create()`
+        (plan.generate_pk or plan.pk_related_model is not None)
+        # Signals are sent with the model instances
+        and not sends_model_signals(model)
+        # Object IDs are remapped by content type
+        and not plan.generic_fk_fields
+        and not any(
+            (opts.label_lower, field.name) in unique_field_generators
+            for field in opts.concrete_fields
+        )
+        # Multi-table inheritance
+        and not opts.parents
+    )
+
+
+def create_mapping_table(
+    connection, model, old_id_to_new_id_map, table_name, key_column='old_pk'
+):
+    """
+    Create a temporary table `table_name` with the columns `old_pk` and `new_pk`
+    holding the old -> new primary keys of `model`, with `key_column` as the
+    primary key. `old_id_to_new_id_map` may also be a list of mappings (e.g. of
+    several copies), when `key_column` is `'new_pk'`.
+    """
+    qn = connection.ops.quote_name
+    pk = model._meta.pk
+    if isinstance(pk, AutoFieldMixin):
+        # Copied values, the mapping table has no sequence of its own
+        pk_type = pk.rel_db_type(connection)
+    else:
+        pk_type = pk.db_type(connection)
+    other_column = 'new_pk' if key_column == 'old_pk' else 'old_pk'
+    if isinstance(old_id_to_new_id_map, dict):
+        old_id_to_new_id_map = [old_id_to_new_id_map]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE {qn(table_name)} '
+            f'({key_column} {pk_type} PRIMARY KEY, {other_column} {pk_type} NOT NULL)'
+        )
+        mapping = [
+            (
+                pk.get_db_prep_value(old_pk, connection),
+                pk.get_db_prep_value(new_pk, connection),
+            )
+            for pk_map in old_id_to_new_id_map
+            for old_pk, new_pk in pk_map.get(model, {}).items()
+        ]
+        for batch in chunked(mapping, 500):
+            cursor.executemany(
+                f'INSERT INTO {qn(table_name)} (old_pk, new_pk) VALUES (%s, %s)',
+                batch,
+            )
+
+
+def copy_deferred_fields(
+    connection, deferred_fields, old_id_to_new_id_maps, batch_size=None
+):
+    """
+    Copy the values of the `deferred_fields` (see `get_deferred_fields()`) of the
+    inserted copies from the original rows inside the database: the new -> old
+    primary keys of each model are written to a temporary table (in batches), and
+    the columns are set with an `UPDATE t SET col = (SELECT col FROM t ...)`
+    statement per batch of at most `batch_size` copies.
+    """
+    qn = connection.ops.quote_name
+    table_prefix = f'deepcopy_{uuid4().hex[:12]}'
+    with connection.cursor() as cursor:
+        for index, (model, fields) in enumerate(deferred_fields.items()):
+            if not any(pk_map.get(model) for pk_map in old_id_to_new_id_maps):
+                continue
+            opts = model._meta
+            table = qn(opts.db_table)
+            pk_column = qn(opts.pk.column)
+            mapping_table = qn(f'{table_prefix}_{index}')
+            create_mapping_table(
+                connection,
+                model,
+                old_id_to_new_id_maps,
+                f'{table_prefix}_{index}',
+                key_column='new_pk',
+            )
+            assignments = [
+                f'{qn(field.column)} = (SELECT s.{qn(field.column)} FROM {table} s '
+                f'INNER JOIN {mapping_table} m ON m.old_pk = s.{pk_column} '
+                f'WHERE m.new_pk = {table}.{pk_column})'
+                for field in fields
+            ]
+            new_pks = [
+                opts.pk.get_db_prep_value(new_pk, connection)
+                for pk_map in old_id_to_new_id_maps
+                for new_pk in pk_map.get(model, {}).values()
+            ]
+            query_batch_size = batch_size or connection.ops.bulk_batch_size(
+                [opts.pk], new_pks
+            )
+            logger.debug(
+                f'  Copying {", ".join(field.name for field in fields)} of '
+                f'{opts.label} in the database...'
+            )
+            for pks in chunked(new_pks, query_batch_size):
+                cursor.execute(
+                    f'UPDATE {table} SET {", ".join(assignments)} '
+                    f'WHERE {pk_column} IN ({", ".join(["%s"] * len(pks))})',
+                    pks,
+                )
+            cursor.execute(f'DROP TABLE {mapping_table}')
+            logger.debug('  Done')
+
+
+def insert_select_copies(connection, model, mapping_tables):
+    """
+    Copy the rows of `model` that are in its mapping table with one
+    `INSERT INTO t (...) SELECT ... FROM t JOIN mapping ...` statement. Foreign
+    keys are rewritten through the mapping tables of the models they point to.
+    """
+    qn = connection.ops.quote_name
+    opts = model._meta
+    columns = []
+    select = []
+    joins = [
+        f'INNER JOIN {qn(mapping_tables[model])} m0 '
+        f'ON m0.old_pk = s.{qn(opts.pk.column)}'
+    ]
+    for field in opts.concrete_fields:
+        if getattr(field, 'generated', False):
+            continue
+        columns.append(qn(field.column))
+        if field.primary_key and not field.is_relation:
+            select.append('m0.new_pk')
+            continue
+        related_model = field.related_model and field.related_model._meta.concrete_model
+        if field.primary_key:
+            # A relation, whose copy has the primary key of the related copy
+            alias = f'm{len(joins)}'
+            joins.append(
+                f'INNER JOIN {qn(mapping_tables[related_model])} {alias} '
+                f'ON {alias}.old_pk = s.{qn(field.column)}'
+            )
+            select.append(f'{alias}.new_pk')
+        elif (
+            field.is_relation
+            and field.target_field.primary_key
+            and related_model in mapping_tables
+        ):
+            alias = f'm{len(joins)}'
+            joins.append(
+                f'LEFT JOIN {qn(mapping_tables[related_model])} {alias} '
+                f'ON {alias}.old_pk = s.{qn(field.column)}'
+            )
+            select.append(f'COALESCE({alias}.new_pk, s.{qn(field.column)})')
+        else:
+            select.append(f's.{qn(field.column)}')
+
+    logger.debug(f'  Copying {opts.label} in the database...')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {qn(opts.db_table)} ({", ".join(columns)}) '
+            f'SELECT {", ".join(select)} FROM {qn(opts.db_table)} s ' + ' '.join(joins)
+        )
+        report_copies(model, cursor.rowcount)
+    logger.debug('  Done')
+
+
+def insert_select_m2m_copies(connection, model, mapping_tables):
+    # Like `insert_select_copies()` for the auto-created through models of `model`,
+    # returns the through models
+    qn = connection.ops.quote_name
+    through_models = []
+    for field in model._meta.many_to_many:
+        through = field.remote_field.through
+        if not through._meta.auto_created:
+            continue
+        source_column = through._meta.get_field(field.m2m_field_name()).column
+        target_column = through._meta.get_field(field.m2m_reverse_field_name()).column
+        related_model = field.related_model._meta.concrete_model
+        target_select = f's.{qn(target_column)}'
+        target_join = ''
+        if related_model in mapping_tables:
+            target_select = f'COALESCE(m1.new_pk, s.{qn(target_column)})'
+            target_join = (
+                f'LEFT JOIN {qn(mapping_tables[related_model])} m1 '
+                f'ON m1.old_pk = s.{qn(target_column)}'
+            )
+
+        logger.debug(f'  Copying {through._meta.label} in the database...')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {qn(through._meta.db_table)} '
+                f'({qn(source_column)}, {qn(target_column)}) '
+                f'SELECT m0.new_pk, {target_select} '
+                f'FROM {qn(through._meta.db_table)} s '
+                f'INNER JOIN {qn(mapping_tables[model])} m0 '
+                f'ON m0.old_pk = s.{qn(source_column)} {target_join}'
+            )
+            report_copies(through, cursor.rowcount)
+        logger.debug('  Done')
+        through_models.append(through)
+    return through_models
+
+
+def copy_in_database(
+    obj,
+    ignored_models=None,
+    dangling_models=None,
+    unique_field_generators=None,
+    batch_size=None,
+    constraint_checks=CONSTRAINT_CHECKS_DEFERRED,
+):
+    """
+    Copy `obj` and its related objects inside the database: only the primary and
+    foreign keys are collected, the old -> new primary key mapping is written to
+    temporary tables, and every model is copied with a single `INSERT ... SELECT`.
+
+    Models that cannot be copied this way (see `can_copy_in_database()`) are
+    collected and inserted by the native engine first. Returns the old -> new
+    primary key mapping.
+    """
+    options = get_options()
+    if unique_field_generators is None:
+        unique_field_generators = {}
+    plan = get_copy_plan(type(obj), ignored_models, dangling_models)
+    connection = connections[options.using]
+
+    report_phase('collect')
+    key_rows_by_model = get_all_related_rows(
+        obj,
+        ignored_models,
+        dangling_models,
+        collect_batch_size=options.collect_batch_size,
+        keys_only=True,
+    )
+    database_models = [
+        model
+        for model in plan.insert_order
+        if model in key_rows_by_model
+        and key_rows_by_model[model]
+        and not is_excluded_model(model)
+        and router.allow_migrate_model(options.using, model)
+        and can_copy_in_database(model, unique_field_generators)
+    ]
+    python_rows_by_model = {}
+    deferred_fields = get_deferred_fields(
+        [model for model in key_rows_by_model if model not in database_models],
+        unique_field_generators,
+    )
+    for model, key_rows in key_rows_by_model.items():
+        if model not in database_models:
+            fetch_new_rows(
+                model,
+                model._meta.pk,
+                list(key_rows),
+                python_rows_by_model,
+                options.collect_batch_size,
+                deferred_fields=deferred_fields,
+            )
+
+    old_id_to_new_id_map = {}
+    generate_pks(
+        {model: key_rows_by_model[model] for model in database_models},
+        old_id_to_new_id_map,
+    )
+    report_intermediate_size(
+        sum(len(rows) for rows in key_rows_by_model.values())
+        + sum(len(rows) for rows in python_rows_by_model.values())
+    )
+
+    report_phase('insert')
+    logger.debug('Starting atomic transaction')
+    with transaction.atomic(using=options.using):
+        with disable_constraint_checks(connection, constraint_checks):
+            # The copies made in Python may have auto-incrementing primary keys,
+            # which we need in the mapping before copying the rows referencing
+            # them. References the other way round are known in advance.
+            batches, old_id_to_new_id_map = copy_rows(
+                python_rows_by_model,
+                unique_field_generators=unique_field_generators,
+                batch_size=batch_size,
+                old_id_to_new_id_map=old_id_to_new_id_map,
+            )
+            inserted_models = bulk_insert_copies(
+                [(batches, old_id_to_new_id_map)],
+                batch_size=batch_size,
+                insert_order=plan.insert_order,
+            )
+            if deferred_fields:
+                copy_deferred_fields(
+                    connection,
+                    deferred_fields,
+                    [old_id_to_new_id_map],
+                    batch_size=batch_size,
+                )
+            # Now that the auto-incrementing primary keys are allocated
+            map_related_pks(
+                {model: key_rows_by_model[model] for model in database_models},
+                old_id_to_new_id_map,
+            )
+
+            mapping_tables = {}
+            table_prefix = f'deepcopy_{uuid4().hex[:12]}'
+            for model, pk_map in old_id_to_new_id_map.items():
+                if pk_map:
+                    mapping_tables[model] = f'{table_prefix}_{len(mapping_tables)}'
+                    create_mapping_table(
+                        connection, model, old_id_to_new_id_map, mapping_tables[model]
+                    )
+            for model in database_models:
+                insert_select_copies(connection, model, mapping_tables)
+            for model in database_models:
+                inserted_models += [model] + insert_select_m2m_copies(
+                    connection, model, mapping_tables
+                )
+
+            # If anything fails, the temporary tables are removed when the
+            # transaction is rolled back.
+            with connection.cursor() as cursor:
+                for table_name in mapping_tables.values():
+                    cursor.execute(
+                        f'DROP TABLE {connection.ops.quote_name(table_name)}'
+                    )
+    logger.debug('  Done')
+
+    check_constraints(connection, inserted_models, constraint_checks)
+
+    return old_id_to_new_id_map
+
+
+@dataclass(frozen=True)
+class CopyEstimate:
+    """
+    The result of `plan_deepcopy()`: the number of objects (and many-to-many
+    relations) that a copy would insert per model, in insert order.
+    """
+
+    counts: dict
+    insert_order: tuple
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+
+@with_options
+def plan_deepcopy(obj, ignored_models=None, dangling_models=None):
+    """
+    Estimate what `django_deepcopy(obj)` would copy without fetching any objects:
+    the cascade is walked with one `COUNT` query per model and level, with the
+    objects of each level selected by a subquery on the previous level.
+
+    Returns a `CopyEstimate`.
+    """
+    plan = get_copy_plan(type(obj), ignored_models, dangling_models)
+    counts, _ = count_related_rows(obj, plan)
+    return CopyEstimate(
+        counts={model: counts.get(model, 0) for model in plan.insert_order},
+        insert_order=plan.insert_order,
+    )
+
+
+def count_related_rows(obj, plan):
+    """
+    Count the objects that would be collected for `obj` (and the through-rows of
+    their many-to-many relations), see `plan_deepcopy()`. Returns `{model: count}`
+    and `{model: Q}` selecting the objects of each model.
+    """
+    options = get_options()
+    conditions = {}
+    counts = {}
+    # The number of levels OR-ed together in `conditions`
+    level_counts = {}
+
+    def get_queryset(model, condition):
+        return model._base_manager.using(options.using).filter(condition)
+
+    def get_pks(model, condition):
+        return list(get_queryset(model, condition).values_list('pk', flat=True))
+
+    def count_subtree(level):
+        # Like `collect_rows()`, where `level` is `{model: (Q, depth)}` and a level
+        # is descended into only if it adds objects (which also ends cycles). The
+        # `depth` is the number of subqueries nested in the condition.
+        while level:
+            next_level = {}
+            for model, (level_condition, depth) in level.items():
+                if depth >= MAX_COUNT_SUBQUERY_DEPTH:
+                    level_condition = Q(pk__in=get_pks(model, level_condition))
+                    depth = 0
+                condition = level_condition
+                level_count = 1
+                if model in conditions:
+                    condition = conditions[model] | condition
+                    level_count += level_counts[model]
+                if level_count > MAX_COUNT_SUBQUERY_DEPTH:
+                    # The levels of e.g. a self-referential foreign key, which are
+                    # merged so that the condition doesn't grow with every level
+                    pks = get_pks(model, condition)
+                    condition = Q(pk__in=pks)
+                    level_count = 1
+                    count = len(pks)
+                else:
+                    count = get_queryset(model, condition).count()
+                if count == counts.get(model, 0):
+                    continue
+                conditions[model] = condition
+                counts[model] = count
+                level_counts[model] = level_count
+                for related_model, field in plan.cascade_relations.get(model, ()):
+                    if isinstance(field, GenericCascade):
+                        # The object IDs may be stored with another type than the
+                        # primary keys, so they are selected by primary key values
+                        related_condition = Q(
+                            **{f'{field.attname}__in': get_pks(model, level_condition)}
+                        )
+                        related_depth = 0
+                    else:
+                        related_condition = Q(
+                            **{
+                                f'{field.attname}__in': get_queryset(
+                                    model, level_condition
+                                ).values(field.target_field.attname)
+                            }
+                        )
+                        related_depth = depth + 1
+                    for extra_condition in (
+                        get_relation_condition(field, options.using),
+                        get_collect_filter(related_model),
+                    ):
+                        if extra_condition is not None:
+                            related_condition &= extra_condition
+                    if related_model in next_level:
+                        other_condition, other_depth = next_level[related_model]
+                        related_condition |= other_condition
+                        related_depth = max(related_depth, other_depth)
+                    next_level[related_model] = (related_condition, related_depth)
+            level = next_level
+
+    count_subtree({plan.root_model: (Q(pk=obj.pk), 0)})
+
+    for model, referencing_fields in plan.dangling_references:
+        condition = Q(pk__in=[])
+        for referencing_model, field in referencing_fields:
+            if referencing_model not in conditions:
+                continue
+            referencing_pks = get_queryset(
+                referencing_model, conditions[referencing_model]
+            ).values('pk')
+            if field.many_to_many:
+                through = field.remote_field.through
+                referenced_pks = (
+                    through._base_manager.using(options.using)
+                    .filter(**{f'{field.m2m_field_name()}__in': referencing_pks})
+                    .values(
+                        through._meta.get_field(field.m2m_reverse_field_name()).attname
+                    )
+                )
+            elif field.target_field.primary_key:
+                referenced_pks = get_queryset(
+                    referencing_model, conditions[referencing_model]
+                ).values(field.attname)
+            else:
+                continue
+            condition |= Q(pk__in=referenced_pks)
+        # Nested in the conditions of the referencing models
+        count_subtree({model: (condition, MAX_COUNT_SUBQUERY_DEPTH)})
+
+    for model in plan.models:
+        if is_excluded_model(model) or model not in conditions:
+            continue
+        pks = get_queryset(model, conditions[model]).values('pk')
+        for field in model._meta.many_to_many:
+            through = field.remote_field.through
+            if through._meta.auto_created:
+                counts[through] = (
+                    through._base_manager.using(options.using)
+                    .filter(**{f'{field.m2m_field_name()}__in': pks})
+                    .count()
+                )
+    return counts, conditions
+
+
+class SnapshotCache:
+    """
+    A cache of the collected rows of objects that are copied again and again (e.g.
+    templates), used by `django_deepcopy(obj, snapshot=True)`. Keeps the
+    `max_size` most recently used snapshots in memory and, with a `directory`, also
+    stores them there as pickles so that they are shared between processes. The
+    directory also keeps the `max_size` most recently used snapshots only (by the
+    modification time of the files).
+    """
+
+    def __init__(self, max_size=16, directory=None):
+        self.max_size = max_size
+        self.directory = directory
+        self.snapshots = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key in self.snapshots:
+                self.snapshots.move_to_end(key)
+                return self.snapshots[key]
+        if self.directory is None:
+            return None
+        path = self.get_path(key)
+        try:
+            with open(path, 'rb') as f:
+                snapshot = pickle.load(f)
+            # Marks the snapshot as recently used, see `evict_files()`
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        self.add(key, snapshot)
+        return snapshot
+
+    def set(self, key, snapshot):
+        self.add(key, snapshot)
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self.get_path(key)
+            # Written to a temporary file first, so that readers never see a
+            # partially written snapshot
+            temp_path = f'{path}.{uuid4().hex}.tmp'
+            with open(temp_path, 'wb') as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+            self.evict_files()
+
+    def evict_files(self):
+        # Removes the least recently used snapshots from the directory. Other
+        # processes may be removing the same files.
+        paths = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pickle'):
+                try:
+                    paths.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    pass
+        paths.sort(reverse=True)
+        for _, path in paths[self.max_size :]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def add(self, key, snapshot):
+        with self.lock:
+            self.snapshots[key] = snapshot
+            self.snapshots.move_to_end(key)
+            while len(self.snapshots) > self.max_size:
+                self.snapshots.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.snapshots.clear()
+
+    def get_path(self, key):
+        digest = hashlib.sha256(repr(key).encode()).hexdigest()
+        return os.path.join(self.directory, f'{digest}.pickle')
+
+
+SNAPSHOT_CACHE = SnapshotCache()
+
+
+def get_snapshot_key(obj, plan, ignored_models, dangling_models, version=None):
+    """
+    The cache key of the snapshot of `obj`: the copy plan and options, and the
+    caller's `version` of `obj` or else a fingerprint of the objects to copy -- the
+    number of objects per model and the latest value of their `auto_now` fields.
+    """
+    options = get_options()
+    if version is None:
+        counts, conditions = count_related_rows(obj, plan)
+        version = []
+        for model in plan.insert_order:
+            latest = ()
+            auto_now_fields = [
+                field.attname
+                for field in model._meta.concrete_fields
+                if getattr(field, 'auto_now', False)
+            ]
+            if auto_now_fields and model in conditions:
+                latest = tuple(
+                    model._base_manager.using(options.using)
+                    .filter(conditions[model])
+                    .aggregate(*[Max(attname) for attname in auto_now_fields])
+                    .values()
+                )
+            version.append((model._meta.label, counts.get(model, 0), latest))
+        version = tuple(version)
+    return (
+        obj._meta.concrete_model._meta.label,
+        str(obj.pk),
+        tuple(sorted(m._meta.label for m in ignored_models or ())),
+        tuple(m._meta.label for m in dangling_models or ()),
+        options.using,
+        options.use_natural_foreign_keys,
+        tuple(
+            sorted(
+                (label.lower(), repr(condition))
+                for label, condition in options.collect_filters.items()
+            )
+        ),
+        tuple(
+            sorted((label.lower(), name) for label, name in options.pruned_relations)
+        ),
+        version,
+    )
+
+
+def get_snapshot_rows(obj, ignored_models, dangling_models, batch_size, version=None):
+    """
+    Collect the rows of the objects related to `obj` and of their many-to-many
+    relations (see `fetch_m2m_rows()`), from the snapshot cache if possible.
+    """
+    options = get_options()
+    plan = get_copy_plan(type(obj), ignored_models, dangling_models)
+    key = get_snapshot_key(obj, plan, ignored_models, dangling_models, version)
+    snapshot = options.snapshot_cache.get(key)
+    if snapshot is not None:
+        logger.debug('  Using the snapshot of the related objects')
+        rows_by_label, m2m_rows_by_label = snapshot
+        rows_by_model = {
+            apps.get_model(label): rows for label, rows in rows_by_label.items()
+        }
+        m2m_rows = []
+        for label, name, source_attname, target_attname, rows in m2m_rows_by_label:
+            field = apps.get_model(label)._meta.get_field(name)
+            m2m_rows.append(
+                (
+                    field,
+                    field.remote_field.through,
+                    source_attname,
+                    target_attname,
+                    rows,
+                )
+            )
+        return rows_by_model, m2m_rows
+
+    rows_by_model = get_all_related_rows(
+        obj,
+        ignored_models,
+        dangling_models,
+        collect_batch_size=options.collect_batch_size,
+    )
+    m2m_rows = fetch_m2m_rows(rows_by_model, batch_size=batch_size)
+    # Stored by model label, so that snapshots can be pickled
+    options.snapshot_cache.set(
+        key,
+        (
+            {model._meta.label: rows for model, rows in rows_by_model.items()},
+            [
+                (field.model._meta.label, field.name, source, target, rows)
+                for field, _, source, target, rows in m2m_rows
+            ],
+        ),
+    )
+    return rows_by_model, m2m_rows
+
+
+def copy_in_memory(
+    obj,
+    ignored_models=None,
+    dangling_models=None,
+    unique_field_generators=None,
+    batch_size=None,
+    constraint_checks=CONSTRAINT_CHECKS_DEFERRED,
+    snapshot=False,
+    snapshot_version=None,
+):
+    """
+    Copy `obj` and its related objects with the native engine: the rows are
+    collected (or taken from a snapshot), copied in memory and inserted in bulk.
+    Returns the old -> new primary key mapping.
+    """
+    options = get_options()
+
+    ###### Step 1: Collect all objects related to `obj` #########
+    report_phase('collect')
+    plan = get_copy_plan(type(obj), ignored_models, dangling_models)
+    m2m_rows = None
+    deferred_fields = None
+    if snapshot:
+        rows_by_model, m2m_rows = get_snapshot_rows(
+            obj, ignored_models, dangling_models, batch_size, snapshot_version
+        )
+    else:
+        deferred_fields = get_deferred_fields(plan.models, unique_field_generators)
+        rows_by_model = get_all_related_rows(
+            obj,
+            ignored_models,
+            dangling_models,
+            collect_batch_size=options.collect_batch_size,
+            deferred_fields=deferred_fields,
+        )
+
+    ###### Step 2: Copy the objects in memory with new IDs/pks #########
+    report_phase('copy')
+    batches, old_new_mapping = copy_rows(
+        rows_by_model,
+        unique_field_generators=unique_field_generators,
+        batch_size=batch_size,
+        m2m_rows=m2m_rows,
+    )
+    report_intermediate_size(
+        sum(len(rows) for rows in rows_by_model.values())
+        + sum(len(batch) for batch in batches)
+    )
+
+    ###### Step 3: Insert the copies into the database #########
+    report_phase('insert')
+    insert_copied_objects_into_db(
+        [(batches, old_new_mapping)],
+        batch_size=batch_size,
+        insert_order=plan.insert_order,
+        constraint_checks=constraint_checks,
+        deferred_fields=deferred_fields,
+    )
+    return old_new_mapping
+
+
+def get_copy(obj, old_id_to_new_id_map):
+    # Fetches the copy of `obj` once a copy is finished, and sends
+    # `deepcopy_completed` for it
+    new_obj_id = old_id_to_new_id_map[obj._meta.concrete_model][obj.pk]
+    new_obj = obj._meta.model._base_manager.using(get_options().using).get(
+        pk=new_obj_id
+    )
+    send_deepcopy_completed([obj], [new_obj], [old_id_to_new_id_map])
+    return new_obj
+
+
+@with_options
+@with_report
+def django_deepcopy(
+    obj,
+    ignored_models=None,
+    dangling_models=None,
+    unique_field_generators=None,
+    engine=None,
+    batch_size=None,
+    chunk_size=None,
+    atomic=ATOMIC_COPY,
+    copies=None,
+    constraint_checks=None,
+    dry_run=False,
+    job_id=None,
+    persist_mapping=False,
+    snapshot=False,
+    snapshot_version=None,
+):
+    options = get_options()
+    if dry_run:
+        return plan_deepcopy(obj, ignored_models, dangling_models)
+    if engine is None:
+        engine = options.engine
+    if batch_size is None:
+        batch_size = options.batch_size
+    constraint_checks = get_constraint_checks(constraint_checks)
+    if engine not in (ENGINE_NATIVE, ENGINE_JSON, ENGINE_SQL):
+        raise ValueError(f'Unknown deepcopy engine: {engine!r}')
+    if chunk_size is not None and engine != ENGINE_NATIVE:
+        raise ValueError('`chunk_size` is only supported by the native engine')
+    if job_id is not None and chunk_size is None:
+        raise ValueError('`job_id` requires a `chunk_size`')
+    if job_id is not None and atomic != ATOMIC_CHUNK:
+        # With one atomic block, a failed copy would roll back its progress too
+        raise ValueError('`job_id` requires `atomic=ATOMIC_CHUNK`')
+    if snapshot and (
+        engine != ENGINE_NATIVE or chunk_size is not None or copies is not None
+    ):
+        raise ValueError(
+            '`snapshot` is only supported by the native engine without `chunk_size` '
+            'or `copies`'
+        )
+    if persist_mapping and (engine == ENGINE_JSON or copies is not None):
+        raise ValueError(
+            '`persist_mapping` is not supported by the JSON engine or with `copies`'
+        )
+    if persist_mapping and chunk_size is not None and atomic != ATOMIC_COPY:
+        # The mapping is saved in the atomic block of all the copies
+        raise ValueError('`persist_mapping` requires `atomic=ATOMIC_COPY`')
+
+    if copies is not None:
+        if engine != ENGINE_NATIVE or chunk_size is not None:
+            raise ValueError(
+                '`copies` is only supported by the native engine without `chunk_size`'
+            )
+        return django_deepcopy_many(
+            [obj] * copies,
+            ignored_models,
+            dangling_models,
+            unique_field_generators=unique_field_generators,
+            batch_size=batch_size,
+            constraint_checks=constraint_checks,
+        )
+
+    if engine != ENGINE_JSON:
+        # The mapping is saved in the same transaction as the copies, so that a copy
+        # never exists without its mapping
+        with (
+            transaction.atomic(using=options.using)
+            if persist_mapping
+            else nullcontext()
+        ):
+            if chunk_size is not None:
+                old_new_mapping = copy_in_chunks(
+                    obj,
+                    ignored_models,
+                    dangling_models,
+                    unique_field_generators=unique_field_generators,
+                    batch_size=batch_size,
+                    chunk_size=chunk_size,
+                    atomic=atomic,
+                    constraint_checks=constraint_checks,
+                    job_id=job_id,
+                )
+            elif engine == ENGINE_SQL:
+                old_new_mapping = copy_in_database(
+                    obj,
+                    ignored_models,
+                    dangling_models,
+                    unique_field_generators=unique_field_generators,
+                    batch_size=batch_size,
+                    constraint_checks=constraint_checks,
+                )
+            else:
+                old_new_mapping = copy_in_memory(
+                    obj,
+                    ignored_models,
+                    dangling_models,
+                    unique_field_generators=unique_field_generators,
+                    batch_size=batch_size,
+                    constraint_checks=constraint_checks,
+                    snapshot=snapshot,
+                    snapshot_version=snapshot_version,
+                )
+            if persist_mapping:
+                save_persisted_mapping(obj, old_new_mapping)
+        return get_copy(obj, old_new_mapping)
+
+    ###### Step 1: Collect all objects related to `obj` #########
+    report_phase('collect')
+    all_objs = get_all_related_objects(
+        obj,
+        ignored_models,
+        dangling_models,
+        collect_batch_size=options.collect_batch_size,
+    )
+    for model in dict.fromkeys(o._meta.concrete_model for o in all_objs):
+        if get_remap_plan(model).allocate_pk:
+            # The serialized objects keep their primary keys, see
+            # `create_new_pks_for_objects()`
+            raise NotSupportedError(
+                f'The JSON engine cannot copy {model._meta.label}, which has an '
+                f'auto-incrementing primary key -- use the native engine instead'
+            )
+
+    ###### Step 2: Serialize all collected objects #########
+    report_phase('serialize')
+    object_count = len(all_objs)
+    serialization_stream = StringIO()
+    serializers.serialize(
+        options.serialization_format,
+        # sorted(all_related_objects, key=lambda obj: model_order[obj.model]),
+        all_objs,
+        use_natural_foreign_keys=options.use_natural_foreign_keys,
+        use_natural_primary_keys=options.use_natural_primary_keys,
+        stream=serialization_stream,
+        object_count=object_count,
+    )
+    report_serialized_bytes(serialization_stream)
+    serialization_stream.seek(0)
+    objs = json.load(serialization_stream)
+    report_intermediate_size(len(all_objs) + len(objs))
+
+    ###### Step 3: Create new IDs/pks for the objects #########
+    report_phase('rekey')
+    old_keys = [(obj['model'], obj['pk']) for obj in objs]
+    objs, old_new_mapping = create_new_pks_for_objects(
+        objs, unique_field_generators=unique_field_generators
+    )
+
+    # Get the PK of the copy of `obj`
+    new_obj_id = old_new_mapping[str(obj.id)]
+
+    ###### Step 4: Load serialized objects and insert into the database #########
+    report_phase('insert')
+    insert_serialized_objects_into_db(
+        objs, batch_size=batch_size, constraint_checks=constraint_checks
+    )
+
+    new_obj = obj._meta.model.objects.using(options.using).get(id=new_obj_id)
+    if deepcopy_completed.has_listeners(obj._meta.model):
+        # The mapping of the serialized primary keys, per model
+        mapping = {}
+        for label, old_pk in old_keys:
+            if old_pk in old_new_mapping:
+                model = apps.get_model(label)
+                pk = model._meta.pk
+                mapping.setdefault(model, {})[pk.to_python(old_pk)] = pk.to_python(
+                    old_new_mapping[old_pk]
+                )
+        send_deepcopy_completed([obj], [new_obj], [mapping])
+    return new_obj
+
+
+@with_options
+@with_report
+def django_deepcopy_many(
+    objs,
+    ignored_models=None,
+    dangling_models=None,
+    unique_field_generators=None,
+    batch_size=None,
+    constraint_checks=None,
+):
+    """
+    Copy each of `objs` like `django_deepcopy()` (with the native engine), in one
+    pass: the related objects of all of `objs` are collected together, and the
+    copies are inserted with one `bulk_create()` per model in a single
+    transaction. An object given several times is copied several times.
+
+    Returns the copies of `objs`, in order.
+    """
+    options = get_options()
+    if batch_size is None:
+        batch_size = options.batch_size
+    constraint_checks = get_constraint_checks(constraint_checks)
+    objs = list(objs)
+    if not objs:
+        return []
+    plans = [get_copy_plan(type(obj), ignored_models, dangling_models) for obj in objs]
+
+    ###### Step 1: Collect all objects related to `objs` #########
+    report_phase('collect')
+    deferred_fields = get_deferred_fields(
+        dict.fromkeys(model for plan in plans for model in plan.models),
+        unique_field_generators,
+    )
+    rows_by_root = collect_rows_for_roots(
+        objs,
+        ignored_models,
+        dangling_models,
+        collect_batch_size=options.collect_batch_size,
+        deferred_fields=deferred_fields,
+    )
+
+    ###### Step 2: Copy the objects in memory, with new IDs/pks per copy #########
+    report_phase('copy')
+    all_rows_by_model = {}
+    for rows_by_model in rows_by_root:
+        for model, rows in rows_by_model.items():
+            all_rows_by_model.setdefault(model, {}).update(rows)
+    m2m_rows = fetch_m2m_rows(all_rows_by_model, batch_size=batch_size)
+    # Generated for all the copies at once, so that the copies of an object get
+    # different values
+    generated_by_root = generate_unique_field_values(
+        rows_by_root, unique_field_generators
+    )
+    copy_sets = [
+        copy_rows(
+            rows_by_model,
+            unique_field_generators=unique_field_generators,
+            batch_size=batch_size,
+            m2m_rows=m2m_rows,
+            generated_values=generated_values,
+        )
+        for rows_by_model, generated_values in zip(rows_by_root, generated_by_root)
+    ]
+    report_intermediate_size(
+        sum(len(rows) for rows in all_rows_by_model.values())
+        + sum(len(batch) for batches, _ in copy_sets for batch in batches)
+    )
+
+    ###### Step 3: Insert all the copies into the database #########
+    report_phase('insert')
+    insert_order = None
+    if len({plan.root_model for plan in plans}) == 1:
+        insert_order = plans[0].insert_order
+    insert_copied_objects_into_db(
+        copy_sets,
+        batch_size=batch_size,
+        insert_order=insert_order,
+        constraint_checks=constraint_checks,
+        deferred_fields=deferred_fields,
+    )
+
+    # Get the copies of `objs` with one query per model
+    new_pks = [
+        old_new_mapping[obj._meta.concrete_model][obj.pk]
+        for obj, (_, old_new_mapping) in zip(objs, copy_sets)
+    ]
+    new_pks_by_model = {}
+    for obj, new_pk in zip(objs, new_pks):
+        new_pks_by_model.setdefault(obj._meta.model, []).append(new_pk)
+    new_objs_by_model = {
+        model: model._base_manager.using(options.using).in_bulk(model_new_pks)
+        for model, model_new_pks in new_pks_by_model.items()
+    }
+    new_objs = [
+        new_objs_by_model[obj._meta.model][new_pk] for obj, new_pk in zip(objs, new_pks)
+    ]
+    send_deepcopy_completed(
+        objs, new_objs, [old_new_mapping for _, old_new_mapping in copy_sets]
+    )
+    return new_objs
+
+
+def send_deepcopy_completed(objs, copies, mappings):
+    """
+    Send `deepcopy_completed` once per model of `objs`, with the sender being the
+    model and the arguments:
+
+    - `objs` and `copies`: the copied objects of the model, and their copies
+    - `mappings`: the old -> new primary key mapping `{model: {old_pk: new_pk}}`
+      of each copy
+    - `new_pks`: the primary keys of all the copies (of related objects, too) as
+      `{model: [new_pk, ...]}`
+    """
+    indexes_by_model = {}
+    for index, obj in enumerate(objs):
+        indexes_by_model.setdefault(obj._meta.model, []).append(index)
+    for model, indexes in indexes_by_model.items():
+        if not deepcopy_completed.has_listeners(model):
+            continue
+        new_pks = {}
+        for index in indexes:
+            for mapped_model, pk_map in mappings[index].items():
+                if pk_map:
+                    new_pks.setdefault(mapped_model, []).extend(pk_map.values())
+        deepcopy_completed.send(
+            sender=model,
+            objs=[objs[index] for index in indexes],
+            copies=[copies[index] for index in indexes],
+            mappings=[mappings[index] for index in indexes],
+            new_pks=new_pks,
+        )
+
+
+def get_copy_id(model, pk):
+    # The key of the persisted mapping of the copy `pk` of the root model `model`
+    return f'{model._meta.concrete_model._meta.label}:{pk}'
+
+
+def save_persisted_mapping(obj, old_id_to_new_id_map):
+    connection = connections[get_options().using]
+    create_pk_mapping_table(connection, MAPPING_TABLE, 'copy_id')
+    new_obj_id = old_id_to_new_id_map[obj._meta.concrete_model][obj.pk]
+    copy_id = get_copy_id(type(obj), new_obj_id)
+    for model, pk_map in old_id_to_new_id_map.items():
+        save_pk_mapping(
+            connection, MAPPING_TABLE, 'copy_id', copy_id, model, pk_map.items()
+        )
+
+
+@dataclass(frozen=True)
+class SyncResult:
+    """
+    The result of `django_deepcopy_sync()`: the number of copies inserted, updated
+    and deleted per model (including many-to-many through models).
+    """
+
+    inserted: dict
+    updated: dict
+    deleted: dict
+
+
+@with_options
+@with_report
+def django_deepcopy_sync(
+    source,
+    target,
+    ignored_models=None,
+    dangling_models=None,
+    unique_field_generators=None,
+    batch_size=None,
+    delete=False,
+    constraint_checks=None,
+):
+    """
+    Bring `target`, a copy of `source` made with `persist_mapping=True`, up to date
+    with `source`: objects added to the tree of `source` are copied, copies of
+    changed objects are updated (only the changed fields, keeping the values of
+    fields with a unique field generator) and many-to-many relations are added and
+    removed. With `delete` the copies of objects that were removed from the tree
+    are deleted (along with the objects cascading from them).
+
+    The tree of `source` is collected in full, but only the differences are
+    written. Returns a `SyncResult`.
+    """
+    options = get_options()
+    if batch_size is None:
+        batch_size = options.batch_size
+    if unique_field_generators is None:
+        unique_field_generators = {}
+    constraint_checks = get_constraint_checks(constraint_checks)
+    connection = connections[options.using]
+    plan = get_copy_plan(type(source), ignored_models, dangling_models)
+    copy_id = get_copy_id(type(target), target.pk)
+
+    create_pk_mapping_table(connection, MAPPING_TABLE, 'copy_id')
+    old_id_to_new_id_map = {}
+    load_pk_mapping(connection, MAPPING_TABLE, 'copy_id', copy_id, old_id_to_new_id_map)
+    if old_id_to_new_id_map.get(plan.root_model, {}).get(source.pk) != target.pk:
+        raise ValueError(
+            f'{target!r} is not a copy of {source!r} with a persisted mapping'
+        )
+
+    ###### Step 1: Collect all objects related to `source` #########
+    report_phase('collect')
+    rows_by_model = get_all_related_rows(
+        source,
+        ignored_models,
+        dangling_models,
+        collect_batch_size=options.collect_batch_size,
+    )
+    new_rows_by_model = {
+        model: {
+            pk: row
+            for pk, row in rows.items()
+            if pk not in old_id_to_new_id_map.get(model, {})
+        }
+        for model, rows in rows_by_model.items()
+    }
+
+    inserted = {}
+    updated = {}
+    deleted = {}
+    logger.debug('Starting atomic transaction')
+    with transaction.atomic(using=options.using):
+        ###### Step 2: Copy the objects that have no copy yet #########
+        report_phase('insert')
+        batches, _ = copy_rows(
+            new_rows_by_model,
+            unique_field_generators,
+            batch_size=batch_size,
+            old_id_to_new_id_map=old_id_to_new_id_map,
+            copy_m2m=False,
+        )
+        insert_copied_objects_into_db(
+            [(batches, old_id_to_new_id_map)],
+            batch_size=batch_size,
+            insert_order=plan.insert_order,
+            constraint_checks=constraint_checks,
+        )
+        for model, rows in new_rows_by_model.items():
+            if rows:
+                inserted[model] = len(rows)
+                pk_map = old_id_to_new_id_map[model]
+                save_pk_mapping(
+                    connection,
+                    MAPPING_TABLE,
+                    'copy_id',
+                    copy_id,
+                    model,
+                    [(pk, pk_map[pk]) for pk in rows],
+                )
+
+        ###### Step 3: Update the changed copies and M2M relations #########
+        report_phase('update')
+        for model, rows in rows_by_model.items():
+            changed = update_copies(
+                model,
+                {
+                    pk: row
+                    for pk, row in rows.items()
+                    if pk not in new_rows_by_model[model]
+                },
+                old_id_to_new_id_map,
+                unique_field_generators,
+                batch_size,
+            )
+            if changed:
+                updated[model] = changed
+        for through, added, removed in sync_m2m_copies(
+            rows_by_model, old_id_to_new_id_map, batch_size
+        ):
+            if added:
+                inserted[through] = added
+            if removed:
+                deleted[through] = removed
+
+        ###### Step 4: Delete the copies of removed objects #########
+        if delete:
+            report_phase('delete')
+            for model in plan.models:
+                pk_map = old_id_to_new_id_map.get(model, {})
+                removed_pks = [
+                    pk for pk in pk_map if pk not in rows_by_model.get(model, {})
+                ]
+                if not removed_pks:
+                    continue
+                _, counts = (
+                    model._base_manager.using(options.using)
+                    .filter(pk__in=[pk_map[pk] for pk in removed_pks])
+                    .delete()
+                )
+                for label, count in counts.items():
+                    deleted_model = apps.get_model(label)
+                    deleted[deleted_model] = deleted.get(deleted_model, 0) + count
+                delete_pk_mapping(connection, copy_id, model, removed_pks)
+    logger.debug('  Done')
+
+    return SyncResult(inserted=inserted, updated=updated, deleted=deleted)
+
+
+def update_copies(
+    model, rows, old_id_to_new_id_map, unique_field_generators, batch_size=None
+):
+    """
+    Update the fields of the copies of the collected `rows` of `model` that differ
+    from the (remapped) values of the rows. Returns the number of updated copies.
+    """
+    options = get_options()
+    plan = get_remap_plan(model)
+    fields = model._meta.concrete_fields
+    pk_map = old_id_to_new_id_map[model]
+    fk_maps = {
+        index: old_id_to_new_id_map.get(related_model, {})
+        for index, _, _, related_model in plan.fk_fields
+    }
+    generic_fk_fields = {
+        index: (content_type_index, object_id_field)
+        for content_type_index, index, object_id_field in plan.generic_fk_fields
+    }
+    # The fields that are compared, i.e. all but the primary key and the fields with
+    # a unique field generator
+    indexes = [
+        index
+        for index, field in enumerate(fields)
+        if index != plan.pk_index
+        and (model._meta.label_lower, field.name) not in unique_field_generators
+    ]
+    copies = {}
+    new_pks = [pk_map[pk] for pk in rows]
+    query_batch_size = options.collect_batch_size or connections[
+        options.using
+    ].ops.bulk_batch_size([model._meta.pk], new_pks)
+    for batch in chunked(new_pks, query_batch_size):
+        for row in (
+            model._base_manager.using(options.using)
+            .filter(pk__in=batch)
+            .values_list(*plan.attnames)
+        ):
+            copies[row[plan.pk_index]] = row
+
+    # `{changed field names: [copy, ...]}`, to update each set of fields at once
+    objs_by_fields = {}
+    for old_pk, row in rows.items():
+        copy_row = copies.get(pk_map[old_pk])
+        if copy_row is None:
+            continue
+        values = list(copy_row)
+        changed = []
+        for index in indexes:
+            value = row[index]
+            if index in fk_maps:
+                value = fk_maps[index].get(value, value)
+            elif index in generic_fk_fields:
+                content_type_index, object_id_field = generic_fk_fields[index]
+                value = remap_object_id(
+                    row[content_type_index],
+                    value,
+                    object_id_field,
+                    old_id_to_new_id_map,
+                )
+            if value != values[index]:
+                values[index] = value
+                changed.append(fields[index].name)
+        if changed:
+            objs_by_fields.setdefault(tuple(changed), []).append(model(*values))
+
+    for names, objs in objs_by_fields.items():
+        logger.debug(f'  Updating {len(objs)} {model._meta.label}...')
+        model._base_manager.using(options.using).bulk_update(
+            objs, names, batch_size=batch_size
+        )
+        logger.debug('  Done')
+    return sum(len(objs) for objs in objs_by_fields.values())
+
+
+def sync_m2m_copies(rows_by_model, old_id_to_new_id_map, batch_size=None):
+    """
+    Add and remove the through-rows of the auto-created many-to-many relations of
+    the copies of the collected rows, so that they match those of the originals.
+    Returns `[(through, added, removed), ...]` with the number of through-rows.
+    """
+    options = get_options()
+    connection = connections[options.using]
+    changes = []
+    for field, through, source_attname, target_attname, through_rows in fetch_m2m_rows(
+        rows_by_model, batch_size=batch_size
+    ):
+        model = field.model._meta.concrete_model
+        pk_map = old_id_to_new_id_map[model]
+        target_map = old_id_to_new_id_map.get(
+            field.related_model._meta.concrete_model, {}
+        )
+        expected = {
+            (pk_map[source], target_map.get(target, target))
+            for source, target in through_rows
+        }
+        new_pks = [pk_map[pk] for pk in rows_by_model[model]]
+        existing = {}
+        query_batch_size = batch_size or connection.ops.bulk_batch_size(
+            [source_attname], new_pks
+        )
+        for pks in chunked(new_pks, query_batch_size):
+            for pk, source, target in (
+                through._base_manager.using(options.using)
+                .filter(**{f'{source_attname}__in': pks})
+                .values_list('pk', source_attname, target_attname)
+            ):
+                existing[(source, target)] = pk
+
+        added = [
+            through(**{source_attname: source, target_attname: target})
+            for source, target in expected
+            if (source, target) not in existing
+        ]
+        removed = [pk for key, pk in existing.items() if key not in expected]
+        if added:
+            through._base_manager.using(options.using).bulk_create(
+                added, batch_size=batch_size
+            )
+        for pks in chunked(removed, query_batch_size):
+            through._base_manager.using(options.using).filter(pk__in=pks).delete()
+        changes.append((through, len(added), len(removed)))
+    return changes
+
+
+def delete_pk_mapping(connection, copy_id, model, old_pks):
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for batch in chunked(old_pks, 500):
+            cursor.execute(
+                f'DELETE FROM {qn(MAPPING_TABLE)} WHERE copy_id = %s AND model = %s '
+                f'AND old_pk IN ({", ".join(["%s"] * len(batch))})',
+                [copy_id, model._meta.label] + [str(pk) for pk in batch],
+            )
+
+
+async def adjango_deepcopy(obj, *args, **kwargs):
+    """
+    Like `django_deepcopy()`, but as a coroutine for async code. The copy runs in a
+    thread pool (with a database connection per thread), so that several copies
+    can run concurrently without blocking the event loop.
+    """
+    return await sync_to_async(run_in_worker_thread, thread_sensitive=False)(
+        django_deepcopy, obj, *args, **kwargs
+    )
+
+
+def run_in_worker_thread(func, *args, **kwargs):
+    # The worker threads are not request threads, so Django doesn't close their
+    # database connections for us
+    try:
+        return func(*args, **kwargs)
+    finally:
+        connections.close_all()
@@ -0,0 +1,92 @@
+"""
+Generators of object trees of parameterised shapes, for the benchmarks and the
+query count budgets. Objects are created with `bulk_create()` so that large trees
+are quick to set up.
+"""
+from .testapp.models import Category, Comment, Forum, Post, Reaction, Tag, Thread
+
+
+def create_wide_forum(
+    posts=1000, comments_per_post=50, reactions_per_comment=0, tags=10
+):
+    """
+    A forum with `posts` posts with `comments_per_post` comments each (with
+    `reactions_per_comment` reactions each). Every post is tagged with one of
+    `tags` tags.
+    """
+    forum = Forum.objects.create(name='Wide forum')
+    tag_objs = Tag.objects.bulk_create([Tag(name=f'Tag {i}') for i in range(tags)])
+    post_objs = Post.objects.bulk_create(
+        [Post(forum=forum, body=f'Post {i}') for i in range(posts)]
+    )
+    if tag_objs:
+        Post.tags.through.objects.bulk_create(
+            [
+                Post.tags.through(post=post, tag=tag_objs[i % len(tag_objs)])
+                for i, post in enumerate(post_objs)
+            ]
+        )
+    comment_objs = Comment.objects.bulk_create(
+        [
+            Comment(post=post, body=f'Comment {j} on {post.body}')
+            for post in post_objs
+            for j in range(comments_per_post)
+        ]
+    )
+    Reaction.objects.bulk_create(
+        [
+            Reaction(comment=comment, kind=f'Reaction {k}')
+            for comment in comment_objs
+            for k in range(reactions_per_comment)
+        ]
+    )
+    return forum
+
+
+def create_deep_forum(depth=20, threads_per_category=1, tags=2):
+    """
+    A forum with a chain of `depth` nested categories (integer primary keys and
+    a nullable self-referential foreign key), each with `threads_per_category`
+    threads that are tagged with all of `tags` tags and point to the post of the
+    forum.
+    """
+    forum = Forum.objects.create(name='Deep forum')
+    post = Post.objects.create(forum=forum, body='Post')
+    tag_objs = Tag.objects.bulk_create([Tag(name=f'Tag {i}') for i in range(tags)])
+    parent = None
+    for level in range(depth):
+        parent = Category.objects.create(
+            forum=forum, parent=parent, name=f'Level {level}'
+        )
+        threads = Thread.objects.bulk_create(
+            [
+                Thread(category=parent, title=f'Thread {i}', last_post=post)
+                for i in range(threads_per_category)
+            ]
+        )
+        Thread.tags.through.objects.bulk_create(
+            [
+                Thread.tags.through(thread=thread, tag=tag)
+                for thread in threads
+                for tag in tag_objs
+            ]
+        )
+    return forum
+
+
+def count_rows(forum):
+    """
+    The number of objects (and many-to-many relations) copied with `forum`.
+    """
+    categories = Category.objects.filter(forum=forum)
+    threads = Thread.objects.filter(category__in=categories)
+    return (
+        1
+        + forum.posts.count()
+        + Post.tags.through.objects.filter(post__forum=forum).count()
+        + Comment.objects.filter(post__forum=forum).count()
+        + Reaction.objects.filter(comment__post__forum=forum).count()
+        + categories.count()
+        + threads.count()
+        + Thread.tags.through.objects.filter(thread__in=threads).count()
+    )
@@ -1,9 +1,66 @@
-from django_deepcopy import django_deepcopy
+import os
+import subprocess
+import sys
 
-from .testapp.models import Comment, Forum, Post
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.serializers.base import DeserializedObject
+from django.db import (
+    IntegrityError,
+    NotSupportedError,
+    connection,
+    models,
+    transaction,
+)
+from django.db.models import Q
+from django.db.models.signals import post_save
+from django.test.utils import CaptureQueriesContext, isolate_apps
 
+from django_deepcopy import (
+    ATOMIC_CHUNK,
+    ATOMIC_COPY,
+    CONSTRAINT_CHECKS_IMMEDIATE,
+    ENGINE_JSON,
+    ENGINE_NATIVE,
+    ENGINE_SQL,
+    CopyLimitExceeded,
+    CopyReport,
+    DeepCopyOptions,
+    SnapshotCache,
+    UniqueFieldGenerator,
+    adjango_deepcopy,
+    bulk_insert_copies,
+    bulk_insert_objects,
+    copy_rows,
+    deepcopy_completed,
+    delete_deepcopy_job,
+    django_deepcopy,
+    django_deepcopy_many,
+    django_deepcopy_sync,
+    get_options,
+    get_all_related_rows,
+    get_copy_plan,
+    plan_deepcopy,
+    sort_models_by_dependencies,
+    update_deferred_fields,
+)
 
-def test_basic_deepcopy(db):
+from .shapes import count_rows, create_deep_forum, create_wide_forum
+from .testapp.models import (
+    Category,
+    Comment,
+    Forum,
+    Note,
+    Post,
+    Reaction,
+    Tag,
+    TagDetails,
+    Thread,
+)
+
+
+@pytest.mark.parametrize('engine', [ENGINE_NATIVE, ENGINE_JSON, ENGINE_SQL])
+def test_basic_deepcopy(db, engine):
     forum_a = Forum.objects.create(name='Forum A')
     post_1 = Post.objects.create(forum=forum_a, body='Post 1')
     comment_1_1 = Comment.objects.create(post=post_1, body='Comment 1 on Post 1')
@@ -12,7 +69,7 @@ def test_basic_deepcopy(db):
     comment_2_1 = Comment.objects.create(post=post_2, body='Comment 1 on Post 2')
     comment_2_2 = Comment.objects.create(post=post_2, body='Comment 2 on Post 2')
 
-    forum_b = django_deepcopy(forum_a)
+    forum_b = django_deepcopy(forum_a, engine=engine)
 
     assert set(forum_a.posts.all()) & set(forum_b.posts.all()) == set()
     forum_a_post_ids = set()
@@ -25,3 +82,1204 @@ def test_basic_deepcopy(db):
         assert post.id not in forum_a_post_ids
         for comment in post.comments.all():
             assert comment.id not in forum_a_comment_ids
+
+
+@pytest.mark.parametrize('engine', [ENGINE_NATIVE, ENGINE_JSON, ENGINE_SQL])
+def test_deepcopy_copies_field_values(db, engine):
+    forum_a = Forum.objects.create(name='Forum A')
+    post = Post.objects.create(forum=forum_a, body='Post 1')
+    Comment.objects.create(post=post, body='Comment 1 on Post 1')
+
+    forum_b = django_deepcopy(forum_a, engine=engine)
+
+    assert forum_b.id != forum_a.id
+    assert forum_b.name == 'Forum A'
+    post_b = forum_b.posts.get()
+    assert post_b.body == 'Post 1'
+    assert [c.body for c in post_b.comments.all()] == ['Comment 1 on Post 1']
+    assert Forum.objects.count() == 2
+    assert Post.objects.count() == 2
+    assert Comment.objects.count() == 2
+
+
+def test_deepcopy_unknown_engine(db):
+    forum = Forum.objects.create(name='Forum A')
+    with pytest.raises(ValueError):
+        django_deepcopy(forum, engine='xml')
+
+
+@pytest.mark.parametrize('engine', [ENGINE_NATIVE, ENGINE_JSON])
+def test_deepcopy_inserts_in_batches_per_model(db, engine):
+    forum_a = Forum.objects.create(name='Forum A')
+    for i in range(10):
+        post = Post.objects.create(forum=forum_a, body=f'Post {i}')
+        for j in range(5):
+            Comment.objects.create(post=post, body=f'Comment {j} on Post {i}')
+
+    with CaptureQueriesContext(connection) as ctx:
+        django_deepcopy(forum_a, engine=engine, batch_size=20)
+
+    inserts = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('INSERT')]
+    # Forum: 1, Post: 1, Comment: 50 / 20 = 3
+    assert len(inserts) == 5
+    assert not [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+
+
+def test_bulk_insert_fails_on_duplicate_primary_keys(db):
+    forum = Forum.objects.create(name='Forum A')
+    with pytest.raises(IntegrityError):
+        with transaction.atomic():
+            bulk_insert_objects([Forum(id=forum.id, name='Forum B')])
+    assert Forum.objects.get().name == 'Forum A'
+
+
+def test_sort_models_by_dependencies():
+    assert sort_models_by_dependencies([Comment, Forum, Post]) == [
+        Forum,
+        Post,
+        Comment,
+    ]
+
+
+def test_sort_models_by_dependencies_with_cycles():
+    with isolate_apps('tests.testapp'):
+
+        class Shop(models.Model):
+            class Meta:
+                app_label = 'testapp'
+
+        class Owner(models.Model):
+            # `Owner` and `Pet` reference each other, only `Owner.favorite` can be
+            # NULL
+            shop = models.ForeignKey(Shop, on_delete=models.CASCADE)
+            favorite = models.ForeignKey('Pet', on_delete=models.SET_NULL, null=True)
+
+            class Meta:
+                app_label = 'testapp'
+
+        class Pet(models.Model):
+            owner = models.ForeignKey(Owner, on_delete=models.CASCADE)
+            mother = models.ForeignKey('self', on_delete=models.SET_NULL, null=True)
+
+            class Meta:
+                app_label = 'testapp'
+
+        class Toy(models.Model):
+            pet = models.ForeignKey(Pet, on_delete=models.CASCADE)
+
+            class Meta:
+                app_label = 'testapp'
+
+    # The cycle comes after `Shop` and before `Toy`, and is broken at the nullable
+    # `Owner.favorite`
+    assert sort_models_by_dependencies([Toy, Pet, Owner, Shop]) == [
+        Shop,
+        Owner,
+        Pet,
+        Toy,
+    ]
+
+
+@pytest.mark.parametrize('engine', [ENGINE_NATIVE, ENGINE_JSON, ENGINE_SQL])
+def test_deepcopy_copies_many_to_many_relations_in_bulk(db, engine):
+    tag_a = Tag.objects.create(name='A')
+    tag_b = Tag.objects.create(name='B')
+    forum_a = Forum.objects.create(name='Forum A')
+    for i in range(5):
+        post = Post.objects.create(forum=forum_a, body=f'Post {i}')
+        post.tags.set([tag_a, tag_b])
+
+    with CaptureQueriesContext(connection) as ctx:
+        forum_b = django_deepcopy(forum_a, engine=engine)
+
+    # Tags are referenced, not copied
+    assert Tag.objects.count() == 2
+    for post in forum_b.posts.all():
+        assert set(post.tags.all()) == {tag_a, tag_b}
+    through_table = Post.tags.through._meta.db_table
+    through_queries = [
+        q['sql'] for q in ctx.captured_queries if through_table in q['sql']
+    ]
+    assert len([sql for sql in through_queries if sql.startswith('INSERT')]) == 1
+    assert not [sql for sql in through_queries if sql.startswith('DELETE')]
+
+
+@pytest.mark.parametrize('engine', [ENGINE_NATIVE, ENGINE_JSON, ENGINE_SQL])
+def test_deepcopy_only_remaps_relation_fields(db, engine):
+    forum_a = Forum.objects.create(name='Forum A')
+    post = Post.objects.create(forum=forum_a, body=str(forum_a.id))
+    Comment.objects.create(post=post, body=f'{post.id} is a great post')
+
+    forum_b = django_deepcopy(forum_a, engine=engine)
+
+    post_b = forum_b.posts.get()
+    assert post_b.body == str(forum_a.id)
+    assert post_b.comments.get().body == f'{post.id} is a great post'
+
+
+def test_copy_rows_remaps_key_columns(db):
+    forum_a = Forum.objects.create(name='Forum A')
+    tag = Tag.objects.create(name='Tag')
+    post = Post.objects.create(forum=forum_a, body='Post')
+    post.tags.add(tag)
+    rows_by_model = get_all_related_rows(forum_a)
+
+    batches, mapping = copy_rows(rows_by_model, None)
+
+    assert {batch.model: len(batch) for batch in batches} == {
+        Forum: 1,
+        Post: 1,
+        Post.tags.through: 1,
+    }
+    post_batch = next(batch for batch in batches if batch.model is Post)
+    assert not hasattr(post_batch, '__dict__')
+    assert post_batch.old_pks == [post.id]
+    assert post_batch.rows == [
+        (mapping[Post][post.id], mapping[Forum][forum_a.id], 'Post')
+    ]
+    through_batch = batches[-1]
+    assert through_batch.rows == [(None, mapping[Post][post.id], tag.id)]
+
+
+def test_deepcopy_allocates_integer_primary_keys(db):
+    forum_a = Forum.objects.create(name='Forum A')
+    root = Category.objects.create(forum=forum_a, name='Root')
+    child = Category.objects.create(forum=forum_a, parent=root, name='Child')
+    # Created before its parent to get a lower primary key than the parent
+    grandchild = Category.objects.create(forum=forum_a, name='Grandchild')
+    grandchild_parent = Category.objects.create(
+        forum=forum_a, parent=child, name='Grandchild parent'
+    )
+    grandchild.parent = grandchild_parent
+    grandchild.save()
+    for category in (root, child, grandchild):
+        Thread.objects.create(category=category, title=f'Thread in {category.name}')
+
+    forum_b = django_deepcopy(forum_a)
+
+    old_ids = {c.id for c in forum_a.categories.all()}
+    categories_b = {c.name: c for c in forum_b.categories.all()}
+    assert len(categories_b) == 4
+    assert not old_ids & {c.id for c in categories_b.values()}
+    assert categories_b['Root'].parent is None
+    assert categories_b['Child'].parent == categories_b['Root']
+    assert categories_b['Grandchild parent'].parent == categories_b['Child']
+    assert categories_b['Grandchild'].parent == categories_b['Grandchild parent']
+    for name in ('Root', 'Child', 'Grandchild'):
+        assert [t.title for t in categories_b[name].threads.all()] == [
+            f'Thread in {name}'
+        ]
+    assert Thread.objects.count() == 6
+
+
+def test_deepcopy_rejects_integer_primary_keys_without_returning(db, monkeypatch):
+    monkeypatch.setattr(
+        type(connection.features), 'can_return_rows_from_bulk_insert', False
+    )
+    forum_a = Forum.objects.create(name='Forum A')
+    category = Category.objects.create(forum=forum_a, name='Root')
+    Thread.objects.create(category=category, title='Thread')
+
+    with pytest.raises(NotSupportedError):
+        django_deepcopy(forum_a)
+
+    assert Forum.objects.count() == 1
+    assert Category.objects.count() == 1
+
+
+@pytest.mark.parametrize('engine', [ENGINE_NATIVE, ENGINE_JSON])
+def test_deepcopy_copies_many_to_many_relations_without_returning(
+    db, engine, monkeypatch
+):
+    monkeypatch.setattr(
+        type(connection.features), 'can_return_rows_from_bulk_insert', False
+    )
+    forum_a = Forum.objects.create(name='Forum A')
+    tag = Tag.objects.create(name='Tag')
+    Post.objects.create(forum=forum_a, body='Post').tags.add(tag)
+
+    forum_b = django_deepcopy(forum_a, engine=engine)
+
+    assert list(forum_b.posts.get().tags.all()) == [tag]
+    assert Post.tags.through.objects.count() == 2
+
+
+def test_json_engine_rejects_integer_primary_keys(db):
+    forum_a = Forum.objects.create(name='Forum A')
+    category = Category.objects.create(forum=forum_a, name='Root')
+
+    for obj in (forum_a, category):
+        with pytest.raises(NotSupportedError):
+            django_deepcopy(obj, engine=ENGINE_JSON)
+
+    assert Forum.objects.count() == 1
+    assert Category.objects.count() == 1
+
+
+def test_copy_plan():
+    plan = get_copy_plan(Forum)
+
+    assert set(plan.models) == {Forum, Post, Comment, Reaction, Category, Thread}
+    assert Tag not in plan.models
+    insert_order = list(plan.insert_order)
+    assert insert_order.index(Forum) < insert_order.index(Post)
+    assert insert_order.index(Post) < insert_order.index(Comment)
+    assert insert_order.index(Post) < insert_order.index(Post.tags.through)
+    assert Post.tags.through._meta.db_table in plan.db_tables
+
+    plan = get_copy_plan(Forum, ignored_models=[Comment], dangling_models=[Tag])
+    assert Comment not in plan.models
+    assert Tag in plan.models
+    assert plan.dangling_references == (
+        (
+            Tag,
+            (
+                (Post, Post._meta.get_field('tags')),
+                (Thread, Thread._meta.get_field('tags')),
+            ),
+        ),
+    )
+
+
+def test_copy_plan_is_cached_until_models_change():
+    plan = get_copy_plan(Forum)
+    assert get_copy_plan(Forum) is plan
+    assert get_copy_plan(Forum, ignored_models=[Comment]) is not plan
+
+    with isolate_apps('tests.testapp'):
+
+        class Reply(models.Model):
+            comment = models.ForeignKey(Comment, on_delete=models.CASCADE)
+
+            class Meta:
+                app_label = 'testapp'
+
+    assert get_copy_plan(Forum) is not plan
+
+
+@pytest.mark.parametrize(
+    'engine, chunk_size',
+    [
+        (ENGINE_NATIVE, None),
+        (ENGINE_NATIVE, 1),
+        (ENGINE_JSON, None),
+        (ENGINE_SQL, None),
+    ],
+)
+def test_deepcopy_copies_generic_relations(db, engine, chunk_size):
+    forum_a = Forum.objects.create(name='Forum A')
+    tag = Tag.objects.create(name='Tag')
+    Note.objects.create(content_object=tag, text='Note')
+    Note.objects.create(content_object=forum_a, text='Not related to the tag')
+    Post.objects.create(forum=forum_a, body='Post').tags.add(tag)
+
+    estimate = plan_deepcopy(forum_a, dangling_models=[Tag])
+    forum_b = django_deepcopy(
+        forum_a, dangling_models=[Tag], engine=engine, chunk_size=chunk_size
+    )
+
+    assert estimate.counts[Note] == 1
+    new_tag = forum_b.posts.get().tags.get()
+    assert [note.text for note in new_tag.notes.all()] == ['Note']
+    assert [note.text for note in tag.notes.all()] == ['Note']
+    assert Note.objects.count() == 3
+
+
+def test_deepcopy_collects_one_query_per_relation(db):
+    forum_a = Forum.objects.create(name='Forum A')
+    for i in range(10):
+        post = Post.objects.create(forum=forum_a, body=f'Post {i}')
+        for j in range(5):
+            Comment.objects.create(post=post, body=f'Comment {j} on Post {i}')
+
+    with CaptureQueriesContext(connection) as ctx:
+        rows_by_model = get_all_related_rows(forum_a)
+
+    assert len(rows_by_model[Post]) == 10
+    assert len(rows_by_model[Comment]) == 50
+    # Forum, Forum.posts, Forum.categories, Post.comments, Comment.reactions
+    # (Category and Thread are skipped as there are no categories)
+    assert len(ctx.captured_queries) == 5
+
+
+def test_deepcopy_copies_many_times_in_one_pass(db):
+    forum_a = Forum.objects.create(name='Forum A')
+    tag = Tag.objects.create(name='Tag')
+    for i in range(3):
+        post = Post.objects.create(forum=forum_a, body=f'Post {i}')
+        post.tags.add(tag)
+        Comment.objects.create(post=post, body=f'Comment on Post {i}')
+    root = Category.objects.create(forum=forum_a, name='Root')
+    Category.objects.create(forum=forum_a, parent=root, name='Child')
+
+    with CaptureQueriesContext(connection) as single_ctx:
+        django_deepcopy(forum_a)
+    with CaptureQueriesContext(connection) as ctx:
+        copies = django_deepcopy(forum_a, copies=3)
+
+    assert len(copies) == 3
+    assert len({forum.id for forum in copies} | {forum_a.id}) == 4
+    for forum in copies:
+        assert forum.name == 'Forum A'
+        assert sorted(p.body for p in forum.posts.all()) == [
+            'Post 0',
+            'Post 1',
+            'Post 2',
+        ]
+        for post in forum.posts.all():
+            assert list(post.tags.all()) == [tag]
+            assert post.comments.get().body == f'Comment on {post.body}'
+        child = forum.categories.get(name='Child')
+        assert child.parent.forum_id == forum.id
+    assert Post.objects.count() == 15
+    assert Tag.objects.count() == 1
+
+    # The related objects are collected once for all the copies, and each model
+    # is inserted with a single `bulk_create()`
+    def select_count(ctx):
+        return len([q for q in ctx.captured_queries if q['sql'].startswith('SELECT')])
+
+    assert select_count(ctx) == select_count(single_ctx)
+    queries = [query['sql'] for query in ctx.captured_queries]
+    for model in (Forum, Post, Comment, Category, Post.tags.through):
+        inserts = [
+            sql
+            for sql in queries
+            if sql.startswith(f'INSERT INTO "{model._meta.db_table}"')
+        ]
+        assert len(inserts) == 1
+
+
+def test_deepcopy_many_copies_overlapping_roots_independently(db):
+    forum_a = Forum.objects.create(name='Forum A')
+    forum_b = Forum.objects.create(name='Forum B')
+    post_a = Post.objects.create(forum=forum_a, body='Post A')
+    Comment.objects.create(post=post_a, body='Comment on Post A')
+    Post.objects.create(forum=forum_b, body='Post B')
+
+    new_post_a, new_forum_a, new_forum_b = django_deepcopy_many(
+        [post_a, forum_a, forum_b]
+    )
+
+    assert new_post_a.forum_id == forum_a.id
+    assert new_post_a.comments.get().body == 'Comment on Post A'
+    assert new_forum_a.name == 'Forum A'
+    assert new_forum_a.posts.get().comments.get().body == 'Comment on Post A'
+    assert new_forum_b.posts.get().body == 'Post B'
+    assert len({new_post_a.id, new_forum_a.posts.get().id, post_a.id}) == 3
+    assert forum_a.posts.count() == 2
+    assert Comment.objects.count() == 3
+
+
+@pytest.mark.parametrize('engine', [ENGINE_NATIVE, ENGINE_JSON, ENGINE_SQL])
+def test_deepcopy_copies_dangling_models(db, engine):
+    forum_a = Forum.objects.create(name='Forum A')
+    tags = [Tag.objects.create(name=f'Tag {i}') for i in range(2)]
+    for i in range(3):
+        post = Post.objects.create(forum=forum_a, body=f'Post {i}')
+        post.tags.set(tags[: i % 2 + 1])
+
+    forum_b = django_deepcopy(forum_a, dangling_models=[Tag], engine=engine)
+
+    assert Tag.objects.count() == 4
+    posts_b = {p.body: p for p in forum_b.posts.all()}
+    new_tags = set(posts_b['Post 1'].tags.all())
+    assert {t.name for t in new_tags} == {'Tag 0', 'Tag 1'}
+    assert not new_tags & set(tags)
+    assert set(posts_b['Post 0'].tags.all()) < new_tags
+
+
+@pytest.mark.parametrize(
+    'engine, chunk_size',
+    [
+        (ENGINE_NATIVE, None),
+        (ENGINE_NATIVE, 1),
+        (ENGINE_JSON, None),
+        (ENGINE_SQL, None),
+    ],
+)
+def test_deepcopy_copies_relational_primary_keys(db, engine, chunk_size):
+    forum_a = Forum.objects.create(name='Forum A')
+    tag = Tag.objects.create(name='Tag')
+    TagDetails.objects.create(tag=tag, description='Details')
+    Post.objects.create(forum=forum_a, body='Post').tags.add(tag)
+
+    forum_b = django_deepcopy(
+        forum_a, dangling_models=[Tag], engine=engine, chunk_size=chunk_size
+    )
+
+    new_tag = forum_b.posts.get().tags.get()
+    assert new_tag != tag
+    assert new_tag.details.description == 'Details'
+    assert TagDetails.objects.count() == 2
+
+
+def test_dangling_models_are_collected_with_one_query_per_relation(db):
+    forum_a = Forum.objects.create(name='Forum A')
+    tag = Tag.objects.create(name='Tag')
+    for i in range(10):
+        Post.objects.create(forum=forum_a, body=f'Post {i}').tags.add(tag)
+
+    with CaptureQueriesContext(connection) as ctx:
+        rows_by_model = get_all_related_rows(forum_a, dangling_models=[Tag])
+
+    assert list(rows_by_model[Tag]) == [tag.id]
+    # Forum, Forum.posts, Forum.categories, Post.comments, Post.tags (from the
+    # through table), Tag, Tag.details and Tag.notes
+    assert len(ctx.captured_queries) == 8
+
+
+def test_import_does_not_load_admin():
+    code = (
+        'import sys, django_deepcopy; '
+        'sys.exit("django.contrib.admin.utils" in sys.modules)'
+    )
+    assert subprocess.run([sys.executable, '-c', code]).returncode == 0
+
+
+def test_sql_engine_copies_in_the_database(db):
+    forum_a = Forum.objects.create(name='Forum A')
+    tag = Tag.objects.create(name='A')
+    post = Post.objects.create(forum=forum_a, body='Post 1')
+    post.tags.add(tag)
+    Comment.objects.create(post=post, body='Comment 1 on Post 1')
+
+    with CaptureQueriesContext(connection) as ctx:
+        forum_b = django_deepcopy(forum_a, engine=ENGINE_SQL)
+
+    # Only keys are fetched, payload columns are copied by the database
+    selects = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT')]
+    assert not [sql for sql in selects if '"body"' in sql]
+    assert [
+        q['sql']
+        for q in ctx.captured_queries
+        if q['sql'].startswith('INSERT INTO "testapp_comment"') and 'SELECT' in q['sql']
+    ]
+    post_b = forum_b.posts.get()
+    assert post_b.id != post.id
+    assert list(post_b.tags.all()) == [tag]
+    assert post_b.comments.get().body == 'Comment 1 on Post 1'
+    # The temporary mapping tables are dropped
+    assert not [
+        table
+        for table in connection.introspection.table_names()
+        if table.startswith('deepcopy_')
+    ]
+
+
+def test_sql_engine_falls_back_to_python(db):
+    forum_a = Forum.objects.create(name='Forum A')
+    post = Post.objects.create(forum=forum_a, body='Post 1')
+    Comment.objects.create(post=post, body='Comment 1 on Post 1')
+    category = Category.objects.create(forum=forum_a, name='Root')
+    Category.objects.create(forum=forum_a, parent=category, name='Child')
+    Thread.objects.create(category=category, title='Thread')
+
+    forum_b = django_deepcopy(
+        forum_a,
+        engine=ENGINE_SQL,
+        unique_field_generators={('testapp.post', 'body'): lambda body: f'{body}!'},
+    )
+
+    post_b = forum_b.posts.get()
+    assert post_b.body == 'Post 1!'
+    assert post_b.comments.get().body == 'Comment 1 on Post 1'
+    categories_b = {c.name: c for c in forum_b.categories.all()}
+    assert categories_b['Root'].id != category.id
+    assert categories_b['Child'].parent == categories_b['Root']
+    assert categories_b['Root'].threads.get().title == 'Thread'
+
+
+@pytest.mark.parametrize('engine', [ENGINE_NATIVE, ENGINE_JSON, ENGINE_SQL])
+def test_deepcopy_with_unique_field_generator(db, engine):
+    forum_a = Forum.objects.create(name='Forum A')
+    for i in range(5):
+        Post.objects.create(forum=forum_a, body=f'Post {i}')
+    # Taken by other posts
+    Post.objects.create(forum=forum_a, body='Post 1 (copy)')
+    Post.objects.create(forum=forum_a, body='Post 3 (copy)')
+
+    def candidate(body, attempt):
+        return f'{body} (copy)' if attempt == 0 else f'{body} (copy {attempt + 1})'
+
+    with CaptureQueriesContext(connection) as ctx:
+        forum_b = django_deepcopy(
+            forum_a,
+            engine=engine,
+            unique_field_generators={
+                ('testapp.post', 'body'): UniqueFieldGenerator(candidate)
+            },
+        )
+
+    bodies = {p.body for p in forum_b.posts.all()}
+    assert bodies == {
+        'Post 0 (copy)',
+        'Post 1 (copy 2)',
+        'Post 2 (copy)',
+        'Post 3 (copy 2)',
+        'Post 4 (copy)',
+        'Post 1 (copy) (copy)',
+        'Post 3 (copy) (copy)',
+    }
+    # One query for the first candidates, and one for the ones that were taken
+    collision_queries = [
+        q for q in ctx.captured_queries if '"testapp_post"."body" IN' in q['sql']
+    ]
+    assert len(collision_queries) == 2
+
+
+@pytest.mark.parametrize('engine', [ENGINE_NATIVE, ENGINE_SQL, ENGINE_JSON])
+def test_deepcopy_sends_one_completed_signal(db, engine):
+    forum_a = Forum.objects.create(name='Forum A')
+    posts = [Post.objects.create(forum=forum_a, body=f'Post {i}') for i in range(3)]
+    Comment.objects.create(post=posts[0], body='Comment')
+    completed = []
+    saved = []
+
+    def on_completed(sender, **kwargs):
+        completed.append((sender, kwargs))
+
+    def on_saved(sender, **kwargs):
+        saved.append(sender)
+
+    deepcopy_completed.connect(on_completed, sender=Forum)
+    post_save.connect(on_saved)
+    try:
+        forum_b = django_deepcopy(
+            forum_a, options=DeepCopyOptions(engine=engine, send_model_signals=False)
+        )
+    finally:
+        deepcopy_completed.disconnect(on_completed, sender=Forum)
+        post_save.disconnect(on_saved)
+
+    assert saved == []
+    assert len(completed) == 1
+    sender, kwargs = completed[0]
+    assert sender is Forum
+    assert kwargs['objs'] == [forum_a] and kwargs['copies'] == [forum_b]
+    assert kwargs['mappings'][0][Forum] == {forum_a.pk: forum_b.pk}
+    assert sorted(kwargs['new_pks'][Post]) == sorted(p.pk for p in forum_b.posts.all())
+    assert kwargs['new_pks'][Comment] == [Comment.objects.get(post__forum=forum_b).pk]
+
+
+@pytest.mark.parametrize('engine', [ENGINE_NATIVE, ENGINE_SQL, ENGINE_JSON])
+def test_deepcopy_sends_model_signals(db, engine):
+    forum_a = Forum.objects.create(name='Forum A')
+    post = Post.objects.create(forum=forum_a, body='Post')
+    post.tags.add(Tag.objects.create(name='Tag'))
+    Comment.objects.create(post=post, body='Comment')
+    saved = []
+
+    def on_saved(sender, instance, created, raw, **kwargs):
+        saved.append((sender, instance.pk, created, raw))
+
+    post_save.connect(on_saved)
+    try:
+        forum_b = django_deepcopy(forum_a, engine=engine)
+    finally:
+        post_save.disconnect(on_saved)
+
+    post_b = forum_b.posts.get()
+    assert sorted(saved, key=lambda s: s[0].__name__) == [
+        (Comment, post_b.comments.get().pk, True, True),
+        (Forum, forum_b.pk, True, True),
+        (Post, post_b.pk, True, True),
+    ]
+
+
+def test_deepcopy_many_sends_a_completed_signal_per_model(db):
+    forum = Forum.objects.create(name='Forum')
+    post = Post.objects.create(forum=forum, body='Post')
+    completed = []
+
+    def on_completed(sender, **kwargs):
+        completed.append((sender, kwargs['copies']))
+
+    deepcopy_completed.connect(on_completed)
+    try:
+        new_objs = django_deepcopy_many([forum, post, forum])
+    finally:
+        deepcopy_completed.disconnect(on_completed)
+
+    assert completed == [(Forum, [new_objs[0], new_objs[2]]), (Post, [new_objs[1]])]
+
+
+def test_deepcopy_copies_with_unique_field_generator(db):
+    forum_a = Forum.objects.create(name='Forum A')
+    for i in range(2):
+        Post.objects.create(forum=forum_a, body=f'Post {i}')
+
+    forums = django_deepcopy(
+        forum_a,
+        copies=3,
+        unique_field_generators={
+            ('testapp.post', 'body'): UniqueFieldGenerator(
+                lambda body, attempt: f'{body} (copy {attempt + 1})'
+            )
+        },
+    )
+
+    bodies = [p.body for forum in forums for p in forum.posts.all()]
+    assert sorted(bodies) == [
+        f'Post {i} (copy {attempt})' for i in range(2) for attempt in (1, 2, 3)
+    ]
+
+
+@pytest.mark.parametrize('atomic', [ATOMIC_COPY, ATOMIC_CHUNK])
+def test_deepcopy_in_chunks(db, atomic):
+    tag = Tag.objects.create(name='A')
+    forum_a = Forum.objects.create(name='Forum A')
+    for i in range(4):
+        post = Post.objects.create(forum=forum_a, body=f'Post {i}')
+        post.tags.add(tag)
+        for j in range(3):
+            Comment.objects.create(post=post, body=f'Comment {j} on Post {i}')
+    # A chain of categories where every parent is created after its child, so
+    # the parents end up in later chunks
+    categories = [Category.objects.create(forum=forum_a, name=f'{i}') for i in range(5)]
+    for child, parent in zip(categories, categories[1:]):
+        child.parent = parent
+        child.save()
+
+    with CaptureQueriesContext(connection) as ctx:
+        forum_b = django_deepcopy(forum_a, chunk_size=2, atomic=atomic)
+
+    comment_selects = [
+        q['sql']
+        for q in ctx.captured_queries
+        if q['sql'].startswith('SELECT') and '"testapp_comment"."body"' in q['sql']
+    ]
+    assert len(comment_selects) == 6
+    posts_b = forum_b.posts.all()
+    assert len(posts_b) == 4
+    assert not {p.id for p in posts_b} & {p.id for p in forum_a.posts.all()}
+    for post in posts_b:
+        assert list(post.tags.all()) == [tag]
+        assert post.comments.count() == 3
+    categories_b = {c.name: c for c in forum_b.categories.all()}
+    for i in range(4):
+        assert categories_b[str(i)].parent == categories_b[str(i + 1)]
+    assert categories_b['4'].parent is None
+    assert Category.objects.count() == 10
+
+
+def test_deepcopy_commits_every_chunk_outside_a_transaction(transactional_db):
+    forum_a = Forum.objects.create(name='Forum A')
+    categories = [Category.objects.create(forum=forum_a, name=f'{i}') for i in range(3)]
+    for child, parent in zip(categories, categories[1:]):
+        child.parent = parent
+        child.save()
+
+    forum_b = django_deepcopy(forum_a, chunk_size=1, atomic=ATOMIC_CHUNK)
+
+    categories_b = {c.name: c for c in forum_b.categories.all()}
+    assert categories_b['0'].parent == categories_b['1']
+    assert categories_b['1'].parent == categories_b['2']
+
+
+def test_deepcopy_resumes_a_failed_job(transactional_db, monkeypatch):
+    forum_a = Forum.objects.create(name='Forum A')
+    for i in range(3):
+        post = Post.objects.create(forum=forum_a, body=f'Post {i}')
+        Comment.objects.create(post=post, body=f'Comment on Post {i}')
+    # Parents in later chunks than their children, see `test_deepcopy_in_chunks()`
+    categories = [Category.objects.create(forum=forum_a, name=f'{i}') for i in range(6)]
+    for child, parent in zip(categories, categories[1:]):
+        child.parent = parent
+        child.save()
+
+    inserted = []
+
+    def fail_on_third_category_chunk(copy_sets, *args, **kwargs):
+        [(batches, _)] = copy_sets
+        if batches[0].model is Category:
+            if len(inserted) == 2:
+                raise RuntimeError('Copy interrupted')
+            inserted.append(batches)
+        return bulk_insert_copies(copy_sets, *args, **kwargs)
+
+    monkeypatch.setattr(
+        'django_deepcopy.bulk_insert_copies', fail_on_third_category_chunk
+    )
+    with pytest.raises(RuntimeError):
+        django_deepcopy(forum_a, chunk_size=2, atomic=ATOMIC_CHUNK, job_id='job-1')
+    assert Category.objects.count() == 10
+    monkeypatch.undo()
+
+    with CaptureQueriesContext(connection) as ctx:
+        forum_b = django_deepcopy(
+            forum_a, chunk_size=2, atomic=ATOMIC_CHUNK, job_id='job-1'
+        )
+
+    inserts = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('INSERT')]
+    assert not any('"testapp_post"' in sql for sql in inserts)
+    assert Forum.objects.count() == 2
+    assert Post.objects.count() == 6
+    assert Comment.objects.filter(post__forum=forum_b).count() == 3
+    categories_b = {c.name: c for c in forum_b.categories.all()}
+    for i in range(5):
+        assert categories_b[str(i)].parent == categories_b[str(i + 1)]
+    assert categories_b['5'].parent is None
+    assert Category.objects.count() == 12
+
+    # A finished job is not copied again
+    assert (
+        django_deepcopy(forum_a, chunk_size=2, atomic=ATOMIC_CHUNK, job_id='job-1')
+        == forum_b
+    )
+    assert Forum.objects.count() == 2
+    delete_deepcopy_job('job-1')
+    forum_c = django_deepcopy(
+        forum_a, chunk_size=2, atomic=ATOMIC_CHUNK, job_id='job-2'
+    )
+    assert forum_c != forum_b
+
+    # Progress can only be recorded with an atomic block per chunk
+    with pytest.raises(ValueError):
+        django_deepcopy(forum_a, chunk_size=2, atomic=ATOMIC_COPY, job_id='job-3')
+    assert Forum.objects.count() == 3
+
+
+@pytest.mark.parametrize('engine', [ENGINE_NATIVE, ENGINE_SQL])
+def test_deepcopy_sync(db, engine):
+    tags = [Tag.objects.create(name=f'Tag {i}') for i in range(2)]
+    forum_a = Forum.objects.create(name='Forum A')
+    posts = [Post.objects.create(forum=forum_a, body=f'Post {i}') for i in range(3)]
+    for post in posts:
+        Comment.objects.create(post=post, body=f'Comment on {post.body}')
+    posts[2].tags.add(tags[0])
+    category = Category.objects.create(forum=forum_a, name='Category')
+    forum_b = django_deepcopy(forum_a, engine=engine, persist_mapping=True)
+
+    # Edit the original
+    posts[0].body = 'Post 0 edited'
+    posts[0].save()
+    posts[1].delete()
+    posts[2].tags.set([tags[1]])
+    new_post = Post.objects.create(forum=forum_a, body='Post 3')
+    Comment.objects.create(post=new_post, body='Comment on Post 3')
+    Category.objects.create(forum=forum_a, parent=category, name='Child')
+
+    result = django_deepcopy_sync(forum_a, forum_b, delete=True)
+
+    through = Post.tags.through
+    assert result.inserted == {Post: 1, Comment: 1, Category: 1, through: 1}
+    assert result.updated == {Post: 1}
+    assert result.deleted == {Post: 1, Comment: 1, through: 1}
+    posts_b = {p.body: p for p in forum_b.posts.all()}
+    assert set(posts_b) == {'Post 0 edited', 'Post 2', 'Post 3'}
+    assert posts_b['Post 3'].comments.get().body == 'Comment on Post 3'
+    assert list(posts_b['Post 2'].tags.all()) == [tags[1]]
+    child = forum_b.categories.get(name='Child')
+    assert child.parent.forum_id == forum_b.id
+
+    # Nothing changed since the last sync
+    with CaptureQueriesContext(connection) as ctx:
+        result = django_deepcopy_sync(forum_a, forum_b, delete=True)
+    assert result.inserted == result.updated == result.deleted == {}
+    assert not any(
+        q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+        for q in ctx.captured_queries
+    )
+
+
+@pytest.mark.parametrize(
+    'engine, chunk_size',
+    [(ENGINE_NATIVE, None), (ENGINE_NATIVE, 1), (ENGINE_SQL, None)],
+)
+def test_deepcopy_rolls_back_when_persisting_the_mapping_fails(
+    db, engine, chunk_size, monkeypatch
+):
+    forum_a = Forum.objects.create(name='Forum A')
+    Post.objects.create(forum=forum_a, body='Post')
+
+    def save_pk_mapping(*args):
+        raise IntegrityError('Saving the mapping failed')
+
+    monkeypatch.setattr('django_deepcopy.save_pk_mapping', save_pk_mapping)
+    with pytest.raises(IntegrityError):
+        django_deepcopy(
+            forum_a, engine=engine, chunk_size=chunk_size, persist_mapping=True
+        )
+
+    assert Forum.objects.count() == 1
+    assert Post.objects.count() == 1
+    with pytest.raises(ValueError):
+        django_deepcopy(
+            forum_a, chunk_size=1, atomic=ATOMIC_CHUNK, persist_mapping=True
+        )
+
+
+def test_deepcopy_sync_requires_a_persisted_mapping(db):
+    forum_a = Forum.objects.create(name='Forum A')
+    forum_b = django_deepcopy(forum_a)
+
+    with pytest.raises(ValueError):
+        django_deepcopy_sync(forum_a, forum_b)
+
+
+def get_checked_tables(ctx):
+    return {
+        query['sql'][len('PRAGMA foreign_key_check(') : -1].strip('"')
+        for query in ctx.captured_queries
+        if query['sql'].startswith('PRAGMA foreign_key_check(')
+    }
+
+
+@pytest.mark.parametrize('engine', [ENGINE_NATIVE, ENGINE_JSON, ENGINE_SQL])
+def test_deepcopy_checks_constraints_of_written_tables_only(db, engine):
+    forum_a = Forum.objects.create(name='Forum A')
+    post = Post.objects.create(forum=forum_a, body='Post 1')
+    Comment.objects.create(post=post, body='Comment 1 on Post 1')
+
+    with CaptureQueriesContext(connection) as ctx:
+        django_deepcopy(forum_a, engine=engine)
+
+    checked_tables = get_checked_tables(ctx)
+    assert {'testapp_forum', 'testapp_post', 'testapp_comment'} <= checked_tables
+    assert checked_tables <= set(get_copy_plan(Forum).db_tables)
+    assert 'testapp_category' not in checked_tables
+
+
+def test_deepcopy_with_immediate_constraint_checks(transactional_db):
+    forum_a = Forum.objects.create(name='Forum A')
+    # A child created before its parent is inserted before it
+    child = Category.objects.create(forum=forum_a, name='Child')
+    parent = Category.objects.create(forum=forum_a, name='Parent')
+    child.parent = parent
+    child.save()
+
+    with CaptureQueriesContext(connection) as ctx:
+        forum_b = django_deepcopy(
+            forum_a, constraint_checks=CONSTRAINT_CHECKS_IMMEDIATE
+        )
+
+    assert not get_checked_tables(ctx)
+    assert not [q for q in ctx.captured_queries if 'foreign_keys' in q['sql']]
+    categories_b = {c.name: c for c in forum_b.categories.all()}
+    assert categories_b['Child'].parent == categories_b['Parent']
+    # The reference to the parent is inserted as NULL and set with one update
+    updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+    assert len(updates) == 1 and '"parent_id"' in updates[0]
+
+    with pytest.raises(ValueError):
+        django_deepcopy(forum_a, constraint_checks='never')
+
+
+def test_update_deferred_fields(db):
+    forum = Forum.objects.create(name='Forum')
+    post = Post.objects.create(forum=forum, body='Post')
+    category = Category.objects.create(forum=forum, name='Category')
+    tag = Tag.objects.create(name='Tag')
+    threads = Thread.objects.bulk_create(
+        [Thread(category=category, title=f'Thread {i}') for i in range(3)]
+    )
+    deferred_fields = {
+        Thread._meta.get_field('last_post'): str(post.pk),
+        Thread._meta.get_field('tags'): [str(tag.pk)],
+    }
+
+    with CaptureQueriesContext(connection) as ctx:
+        update_deferred_fields(
+            [
+                DeserializedObject(thread, deferred_fields=deferred_fields)
+                for thread in threads
+            ]
+        )
+
+    # One update of `Thread.last_post` and one insert of the tags
+    assert len(ctx.captured_queries) == 2
+    for thread in Thread.objects.all():
+        assert thread.last_post == post
+        assert list(thread.tags.all()) == [tag]
+
+
+@pytest.mark.django_db(databases=['default', 'other'])
+@pytest.mark.parametrize('engine', [ENGINE_NATIVE, ENGINE_JSON, ENGINE_SQL])
+def test_deepcopy_with_options(engine):
+    forum_a = Forum.objects.using('other').create(name='Forum A')
+    post = Post.objects.using('other').create(forum=forum_a, body='Post 1')
+    Comment.objects.using('other').create(post=post, body='Comment 1 on Post 1')
+    options = DeepCopyOptions(using='other', engine=engine, excluded_models=[Comment])
+
+    forum_b = django_deepcopy(forum_a, options=options)
+
+    assert forum_b._state.db == 'other'
+    assert forum_b.posts.get().body == 'Post 1'
+    assert Forum.objects.using('other').count() == 2
+    assert Comment.objects.using('other').count() == 1
+    assert not Forum.objects.exists()
+    # The options only apply to the call
+    assert get_options() == DeepCopyOptions()
+
+
+def test_adjango_deepcopy(transactional_db):
+    forum_a = Forum.objects.create(name='Forum A')
+    Post.objects.create(forum=forum_a, body='Post 1')
+
+    forum_b = async_to_sync(adjango_deepcopy)(forum_a)
+
+    assert forum_b.id != forum_a.id
+    assert forum_b.posts.get().body == 'Post 1'
+
+
+@pytest.mark.parametrize(
+    'engine, phases',
+    [
+        (ENGINE_NATIVE, ['collect', 'copy', 'insert']),
+        (ENGINE_JSON, ['collect', 'serialize', 'rekey', 'insert']),
+        (ENGINE_SQL, ['collect', 'insert']),
+    ],
+)
+def test_deepcopy_report(db, engine, phases):
+    forum_a = Forum.objects.create(name='Forum A')
+    for i in range(2):
+        post = Post.objects.create(forum=forum_a, body=f'Post {i}')
+        Comment.objects.create(post=post, body=f'Comment on Post {i}')
+    finished = []
+    report = CopyReport(
+        callbacks=[lambda report, phase: finished.append(phase and phase.name)]
+    )
+
+    with CaptureQueriesContext(connection) as ctx:
+        django_deepcopy(forum_a, engine=engine, report=report)
+
+    assert list(report.phases) == phases
+    assert finished == phases + [None]
+    assert sum(p.query_count for p in report.phases.values()) == len(
+        ctx.captured_queries
+    )
+    assert all(p.wall_time > 0 for p in report.phases.values())
+    assert report.object_counts == {
+        'testapp.Forum': 1,
+        'testapp.Post': 2,
+        'testapp.Comment': 2,
+    }
+    assert report.peak_intermediate_size >= 5
+    assert (report.bytes_serialized > 0) == (engine == ENGINE_JSON)
+
+
+@pytest.mark.parametrize(
+    'create_forum',
+    [
+        lambda: create_wide_forum(
+            posts=4, comments_per_post=3, reactions_per_comment=2
+        ),
+        lambda: create_deep_forum(depth=6, threads_per_category=2),
+    ],
+)
+def test_plan_deepcopy(db, create_forum):
+    forum = create_forum()
+
+    with CaptureQueriesContext(connection) as ctx:
+        estimate = plan_deepcopy(forum)
+
+    assert all('COUNT(' in query['sql'] for query in ctx.captured_queries)
+    assert estimate.insert_order == get_copy_plan(Forum).insert_order
+    assert list(estimate.counts) == list(estimate.insert_order)
+    assert estimate.total == count_rows(forum)
+    assert estimate.counts[Forum] == 1
+
+
+def test_plan_deepcopy_of_a_deep_chain(db):
+    forum = create_deep_forum(depth=20, threads_per_category=2)
+    root = Category.objects.get(forum=forum, parent=None)
+
+    with CaptureQueriesContext(connection) as ctx:
+        estimate = plan_deepcopy(root)
+
+    assert estimate.counts[Category] == 20
+    assert estimate.counts[Thread] == 40
+    assert estimate.counts[Thread.tags.through] == 80
+    # The nesting of the subqueries is bounded
+    assert max(get_subquery_depth(q['sql']) for q in ctx.captured_queries) <= 8
+
+
+def get_subquery_depth(sql):
+    depth = max_depth = 0
+    # The parentheses that open a subquery
+    subqueries = []
+    for index, char in enumerate(sql):
+        if char == '(':
+            subqueries.append(sql.startswith('(SELECT', index))
+            depth += subqueries[-1]
+            max_depth = max(max_depth, depth)
+        elif char == ')':
+            depth -= subqueries.pop()
+    return max_depth
+
+
+def test_plan_deepcopy_with_dangling_models(db):
+    forum_a = Forum.objects.create(name='Forum A')
+    tags = [Tag.objects.create(name=f'Tag {i}') for i in range(3)]
+    for i in range(3):
+        post = Post.objects.create(forum=forum_a, body=f'Post {i}')
+        post.tags.set(tags[: i % 2 + 1])
+
+    estimate = django_deepcopy(forum_a, dangling_models=[Tag], dry_run=True)
+
+    assert estimate.counts[Post] == 3
+    assert estimate.counts[Post.tags.through] == 4
+    assert estimate.counts[Tag] == 2
+    assert Forum.objects.count() == 1
+
+
+@pytest.mark.parametrize('engine', [ENGINE_NATIVE, ENGINE_JSON, ENGINE_SQL])
+@pytest.mark.parametrize(
+    'options', [DeepCopyOptions(max_objects=5), DeepCopyOptions(max_per_model=2)]
+)
+def test_deepcopy_aborts_when_exceeding_limits(db, engine, options):
+    forum_a = Forum.objects.create(name='Forum A')
+    for i in range(3):
+        post = Post.objects.create(forum=forum_a, body=f'Post {i}')
+        Comment.objects.create(post=post, body=f'Comment on Post {i}')
+
+    with CaptureQueriesContext(connection) as ctx:
+        with pytest.raises(CopyLimitExceeded):
+            django_deepcopy(forum_a, engine=engine, options=options)
+
+    # Aborted while collecting: nothing was inserted
+    assert not any(q['sql'].startswith('INSERT') for q in ctx.captured_queries)
+    assert Forum.objects.count() == 1
+
+
+def test_deepcopy_from_snapshot(db, tmp_path):
+    forum_a = Forum.objects.create(name='Forum A')
+    tag = Tag.objects.create(name='Tag')
+    for i in range(3):
+        post = Post.objects.create(forum=forum_a, body=f'Post {i}')
+        post.tags.add(tag)
+        Comment.objects.create(post=post, body=f'Comment on Post {i}')
+    options = DeepCopyOptions(snapshot_cache=SnapshotCache(directory=tmp_path))
+
+    def copy(**kwargs):
+        report = CopyReport()
+        forum = django_deepcopy(forum_a, options=options, report=report, **kwargs)
+        return forum, report.phases['collect'].query_count
+
+    _, query_count = copy(snapshot=True, snapshot_version='v1')
+    assert query_count > 0
+    forum_b, query_count = copy(snapshot=True, snapshot_version='v1')
+    assert query_count == 0
+    assert forum_b.posts.count() == 3
+    assert all(list(p.tags.all()) == [tag] for p in forum_b.posts.all())
+
+    # Snapshots are stored on disk as well
+    options.snapshot_cache.clear()
+    forum_c, query_count = copy(snapshot=True, snapshot_version='v1')
+    assert query_count == 0
+    assert Comment.objects.filter(post__forum=forum_c).count() == 3
+
+    # Without a version, changes to the objects invalidate the snapshot
+    copy(snapshot=True)
+    with CaptureQueriesContext(connection) as ctx:
+        copy(snapshot=True)
+    collect_queries = []
+    for query in ctx.captured_queries:
+        if query['sql'].startswith('SAVEPOINT'):
+            break
+        collect_queries.append(query['sql'])
+    assert all('COUNT(' in sql for sql in collect_queries)
+    Post.objects.create(forum=forum_a, body='Post 3')
+    forum_d, _ = copy(snapshot=True)
+    assert forum_d.posts.count() == 4
+
+
+def test_deepcopy_from_snapshot_of_a_deep_chain(db):
+    forum = create_deep_forum(depth=40)
+    root = Category.objects.get(forum=forum, parent=None)
+    options = DeepCopyOptions(snapshot_cache=SnapshotCache())
+
+    django_deepcopy(root, snapshot=True, options=options)
+    new_root = django_deepcopy(root, snapshot=True, options=options)
+
+    assert len(options.snapshot_cache.snapshots) == 1
+    category, depth = new_root, 1
+    while category.children.exists():
+        category, depth = category.children.get(), depth + 1
+    assert depth == 40
+
+
+def test_snapshot_cache_evicts_files(tmp_path):
+    cache = SnapshotCache(max_size=2, directory=tmp_path)
+    for version in range(3):
+        cache.set(('snapshot', version), {'rows': version})
+        # The modification times of the files must differ
+        os.utime(cache.get_path(('snapshot', version)), (version, version))
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        os.path.basename(cache.get_path(('snapshot', version))) for version in (1, 2)
+    )
+    cache.clear()
+    assert cache.get(('snapshot', 0)) is None
+    assert cache.get(('snapshot', 2)) == {'rows': 2}
+
+
+@pytest.mark.parametrize('copies, batch_size', [(None, None), (2, None), (2, 4)])
+def test_deepcopy_copies_large_fields_in_the_database(db, copies, batch_size):
+    forum_a = Forum.objects.create(name='Forum A')
+    for i in range(3):
+        post = Post.objects.create(forum=forum_a, body=f'Post {i} ' * 1000)
+        Comment.objects.create(post=post, body=f'Comment on Post {i}')
+    options = DeepCopyOptions(
+        defer_large_fields=True, large_fields={'testapp.comment': []}
+    )
+
+    with CaptureQueriesContext(connection) as ctx:
+        forum_b = django_deepcopy(
+            forum_a, copies=copies, batch_size=batch_size, options=options
+        )
+
+    for forum in forum_b if copies else [forum_b]:
+        assert sorted(p.body for p in forum.posts.all()) == sorted(
+            p.body for p in forum_a.posts.all()
+        )
+        comments = Comment.objects.filter(post__forum=forum)
+        assert sorted(c.body for c in comments) == [
+            f'Comment on Post {i}' for i in range(3)
+        ]
+    # `Post.body` is detected as a large field and never fetched, `Comment.body` is
+    # not a large field per `large_fields`
+    selects = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT')]
+    post_selects = [sql for sql in selects if 'FROM "testapp_post"' in sql]
+    assert post_selects
+    assert not [sql for sql in post_selects if '"testapp_post"."body"' in sql]
+    # One per batch of copies
+    updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+    assert len(updates) == (2 if batch_size else 1)
+    assert all(sql.startswith('UPDATE "testapp_post"') for sql in updates)
+
+
+@pytest.mark.parametrize('engine', [ENGINE_NATIVE, ENGINE_JSON, ENGINE_SQL])
+def test_deepcopy_with_collect_filters(db, engine):
+    forum_a = Forum.objects.create(name='Forum A')
+    for i in range(4):
+        post = Post.objects.create(forum=forum_a, body=f'Post {i}')
+        Comment.objects.create(post=post, body=f'Comment on Post {i}')
+    draft = Post.objects.create(forum=forum_a, body='Draft')
+    Comment.objects.create(post=draft, body='Comment on Draft')
+    Category.objects.create(forum=forum_a, name='Category')
+    options = DeepCopyOptions(
+        engine=engine,
+        collect_filters={
+            'testapp.Post': ~Q(body='Draft'),
+            'testapp.comment': {'body__endswith': '1'},
+        },
+        pruned_relations=[('testapp.category', 'forum')],
+    )
+
+    estimate = plan_deepcopy(forum_a, options=options)
+    with CaptureQueriesContext(connection) as ctx:
+        forum_b = django_deepcopy(forum_a, options=options)
+
+    assert sorted(p.body for p in forum_b.posts.all()) == [
+        f'Post {i}' for i in range(4)
+    ]
+    assert [c.body for c in Comment.objects.filter(post__forum=forum_b)] == [
+        'Comment on Post 1'
+    ]
+    assert not forum_b.categories.exists()
+    # The draft's comment and the categories are never fetched
+    assert not [q for q in ctx.captured_queries if '"testapp_category"' in q['sql']]
+    assert estimate.total == 6 and estimate.counts[Comment] == 1
+    assert Category not in estimate.counts
@@ -0,0 +1,73 @@
+"""
+Maximum number of queries per phase of a copy, for trees of different sizes, so
+that N+1 query regressions fail the tests.
+"""
+import pytest
+
+from django_deepcopy import ENGINE_NATIVE, ENGINE_SQL, CopyReport, django_deepcopy
+
+from .shapes import count_rows, create_deep_forum, create_wide_forum
+from .testapp.models import Category
+
+# `{engine: {phase: max_queries}}` for the copy of a forum. The insert phase
+# includes the savepoint, the constraint checks (one per table) and fetching the
+# copy.
+WIDE_BUDGETS = {
+    ENGINE_NATIVE: {'collect': 5, 'copy': 1, 'insert': 15},
+    ENGINE_SQL: {'collect': 6, 'insert': 27},
+}
+DEEP_BUDGETS = {
+    ENGINE_NATIVE: {'collect': 6, 'copy': 2, 'insert': 16},
+    ENGINE_SQL: {'collect': 8, 'insert': 31},
+}
+
+
+def get_query_counts(report):
+    return {name: phase.query_count for name, phase in report.phases.items()}
+
+
+@pytest.mark.parametrize('engine', [ENGINE_NATIVE, ENGINE_SQL])
+@pytest.mark.parametrize('posts, comments_per_post', [(5, 3), (40, 6)])
+def test_wide_tree_query_budget(db, engine, posts, comments_per_post):
+    forum = create_wide_forum(
+        posts=posts,
+        comments_per_post=comments_per_post,
+        reactions_per_comment=2,
+        tags=3,
+    )
+    report = CopyReport()
+
+    new_forum = django_deepcopy(forum, engine=engine, report=report)
+
+    assert count_rows(new_forum) == count_rows(forum)
+    for phase, query_count in get_query_counts(report).items():
+        assert query_count <= WIDE_BUDGETS[engine][phase], phase
+
+
+@pytest.mark.parametrize('engine', [ENGINE_NATIVE, ENGINE_SQL])
+@pytest.mark.parametrize('depth', [5, 20])
+def test_deep_tree_query_budget(db, engine, depth):
+    forum = create_deep_forum(depth=depth, threads_per_category=2)
+    report = CopyReport()
+
+    new_forum = django_deepcopy(forum, engine=engine, report=report)
+
+    assert count_rows(new_forum) == count_rows(forum)
+    categories = new_forum.categories.exclude(parent=None)
+    assert all(c.parent.forum_id == new_forum.id for c in categories)
+    assert {t.last_post.forum_id for c in categories for t in c.threads.all()} == {
+        new_forum.id
+    }
+    for phase, query_count in get_query_counts(report).items():
+        assert query_count <= DEEP_BUDGETS[engine][phase], phase
+
+
+def test_deep_chain_is_collected_with_queries_per_level(db):
+    forum = create_deep_forum(depth=20, threads_per_category=2)
+    root = Category.objects.get(forum=forum, parent=None)
+    report = CopyReport()
+
+    django_deepcopy(root, report=report)
+
+    # Category.children and Category.threads for each level, plus the leaves
+    assert report.phases['collect'].query_count <= 2 * 20 + 3
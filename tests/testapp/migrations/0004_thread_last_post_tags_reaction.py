@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("testapp", "0003_category_thread"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="thread",
+            name="last_post",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="testapp.post",
+            ),
+        ),
+        migrations.AddField(
+            model_name="thread",
+            name="tags",
+            field=models.ManyToManyField(
+                blank=True, related_name="threads", to="testapp.tag"
+            ),
+        ),
+        migrations.CreateModel(
+            name="Reaction",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("kind", models.CharField(max_length=20)),
+                (
+                    "comment",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reactions",
+                        to="testapp.comment",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("testapp", "0004_thread_last_post_tags_reaction"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TagDetails",
+            fields=[
+                (
+                    "tag",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="details",
+                        serialize=False,
+                        to="testapp.tag",
+                    ),
+                ),
+                ("description", models.CharField(max_length=200)),
+            ],
+        ),
+    ]
@@ -1,4 +1,6 @@
 import uuid
+from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
+from django.contrib.contenttypes.models import ContentType
 from django.db import models
 
 
@@ -11,9 +13,69 @@ class Post(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4)
     forum = models.ForeignKey(Forum, on_delete=models.CASCADE, related_name='posts')
     body = models.CharField(max_length=20000)
+    tags = models.ManyToManyField('Tag', blank=True, related_name='posts')
 
 
 class Comment(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4)
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     body = models.CharField(max_length=20000)
+
+
+class Tag(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4)
+    name = models.CharField(max_length=200)
+    notes = GenericRelation('Note')
+
+
+class Category(models.Model):
+    # Uses the app's default `BigAutoField` primary key
+    forum = models.ForeignKey(
+        Forum, on_delete=models.CASCADE, related_name='categories'
+    )
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='children',
+    )
+    name = models.CharField(max_length=200)
+
+
+class Thread(models.Model):
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name='threads'
+    )
+    title = models.CharField(max_length=200)
+    # A nullable reference across the tree, that doesn't cascade
+    last_post = models.ForeignKey(
+        Post, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    # Many-to-many from a model with an integer primary key
+    tags = models.ManyToManyField(Tag, blank=True, related_name='threads')
+
+
+class Reaction(models.Model):
+    # Integer primary key, below the objects with UUID primary keys
+    comment = models.ForeignKey(
+        Comment, on_delete=models.CASCADE, related_name='reactions'
+    )
+    kind = models.CharField(max_length=20)
+
+
+class TagDetails(models.Model):
+    # The primary key is a relation, copies get the primary key of the copied tag
+    tag = models.OneToOneField(
+        Tag, on_delete=models.CASCADE, primary_key=True, related_name='details'
+    )
+    description = models.CharField(max_length=200)
+
+
+class Note(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4)
+    # The primary keys of the objects pointed to are stored as strings
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.CharField(max_length=64)
+    content_object = GenericForeignKey()
+    text = models.CharField(max_length=200)